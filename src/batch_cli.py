@@ -0,0 +1,185 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch_pricing import greeks_batch, price_batch
+from binomial_tree import black_scholes
+
+INPUT_COLUMNS = ("S0", "K", "T", "r", "sigma", "option_type")
+NUMERIC_COLUMNS = INPUT_COLUMNS[:-1]
+GREEK_COLUMNS = ("delta", "gamma", "theta", "vega", "rho")
+DEFAULT_CHUNK_SIZE = 10000
+PROGRESS_INTERVAL = 5.0
+
+def option_types(values, row_numbers):
+	option_type = np.char.lower(np.char.strip(np.asarray(values, dtype=str)))
+	invalid = np.flatnonzero((option_type != "call") & (option_type != "put"))
+	if invalid.size:
+		raise ValueError(f"row {row_numbers[invalid[0]]}: option_type must be call or put, got {values[invalid[0]]!r}")
+	return option_type
+
+def numeric_column(values, row_numbers, name):
+	try:
+		return np.array(values, dtype=float)
+	except ValueError:
+		# Only a failed chunk is parsed again value by value, to find the row to report
+		for row_number, value in zip(row_numbers, values):
+			try:
+				float(value)
+			except ValueError:
+				raise ValueError(f"row {row_number}: {name} must be a number, got {value!r}") from None
+		raise
+
+def csv_chunks(path, chunk_size):
+	# Yields (input fields, input rows, contract columns) one chunk at a time, so only chunk_size rows are ever parsed at once
+	with open(path, newline="") as file:
+		reader = csv.reader(file)
+		fields = next(reader)
+		missing = [name for name in INPUT_COLUMNS if name not in fields]
+		if missing:
+			raise ValueError(f"{path} is missing the columns {', '.join(missing)}")
+		index = {name: fields.index(name) for name in INPUT_COLUMNS}
+		width = max(index.values()) + 1
+
+		# Blank lines are skipped, errors name the line of the file the row ended on
+		numbered = ((reader.line_num, row) for row in reader if any(field.strip() for field in row))
+		while True:
+			chunk = list(itertools.islice(numbered, chunk_size))
+			if not chunk:
+				return
+			row_numbers = [row_number for row_number, _ in chunk]
+			rows = [row for _, row in chunk]
+			for row_number, row in chunk:
+				if len(row) < width:
+					raise ValueError(f"row {row_number}: expected {len(fields)} fields, got {len(row)}")
+			columns = {name: numeric_column([row[index[name]] for row in rows], row_numbers, name) for name in NUMERIC_COLUMNS}
+			columns['option_type'] = option_types([row[index['option_type']] for row in rows], row_numbers)
+			yield fields, rows, columns
+
+def npy_chunks(path, chunk_size):
+	# Structured arrays are read by field name, plain 2D arrays by INPUT_COLUMNS order with option_type 1 for calls and 0 for puts
+	# The file is memory mapped, so each chunk is only paged in when it is sliced
+	contracts = np.load(path, mmap_mode="r")
+	if contracts.dtype.names:
+		missing = [name for name in INPUT_COLUMNS if name not in contracts.dtype.names]
+		if missing:
+			raise ValueError(f"{path} is missing the fields {', '.join(missing)}")
+		column = lambda chunk, name: chunk[name]
+	elif contracts.ndim == 2 and contracts.shape[1] == len(INPUT_COLUMNS):
+		column = lambda chunk, name: chunk[:, INPUT_COLUMNS.index(name)]
+	else:
+		raise ValueError(f"{path} must hold a structured array or a 2D array with the columns {', '.join(INPUT_COLUMNS)}")
+
+	for start in range(0, len(contracts), chunk_size):
+		chunk = contracts[start:start + chunk_size]
+		columns = {name: np.asarray(column(chunk, name), dtype=float) for name in NUMERIC_COLUMNS}
+		option_type = np.asarray(column(chunk, 'option_type'))
+		if option_type.dtype.kind in "biuf":
+			option_type = np.where(option_type != 0, "call", "put")
+		columns['option_type'] = option_types(option_type, range(start + 1, start + 1 + len(chunk)))
+		rows = zip(*(columns[name].tolist() for name in INPUT_COLUMNS))
+		yield list(INPUT_COLUMNS), rows, columns
+
+def contract_chunks(path, chunk_size):
+	if path.endswith(".npy"):
+		return npy_chunks(path, chunk_size)
+	return csv_chunks(path, chunk_size)
+
+def price_contracts(columns, steps, exercise, with_greeks):
+	# Runs in a worker process, the lattice itself is chunked again inside price_batch and greeks_batch
+	start = time.perf_counter()
+	S0, K, T, r, sigma, option_type = (columns[name] for name in INPUT_COLUMNS)
+	if with_greeks:
+		results = greeks_batch(S0, K, T, r, sigma, option_type, steps, exercise=exercise)
+		results['bs_price'] = black_scholes(S0, K, T, r, sigma, option_type == "call")
+	else:
+		price, bs_price = price_batch(S0, K, T, r, sigma, option_type, steps, exercise=exercise)
+		results = {'price': price, 'bs_price': bs_price}
+	results['seconds'] = np.full(S0.size, (time.perf_counter() - start) / max(S0.size, 1))
+	return results
+
+def output_columns(with_greeks):
+	return ("price", "bs_price") + (GREEK_COLUMNS if with_greeks else ()) + ("seconds",)
+
+def price_file(input_path, output_path, steps, exercise="european", with_greeks=True, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, progress=None):
+	# Chunks are priced out of order by the pool but written in input order; at most two chunks per worker are
+	# in flight, which bounds memory however large the input file is
+	workers = workers or os.cpu_count() or 1
+	columns_out = output_columns(with_greeks)
+	summary = {'contracts': 0, 'chunks': 0, 'workers': workers, 'max_bs_difference': 0.0}
+	start = time.perf_counter()
+	last_progress = start
+
+	with open(output_path, "w", newline="") as file, ProcessPoolExecutor(max_workers=workers) as executor:
+		writer = csv.writer(file)
+		pending = deque()
+
+		def write_oldest():
+			rows, future = pending.popleft()
+			results = future.result()
+			values = [results[name].tolist() for name in columns_out]
+			writer.writerows(list(row) + list(result) for row, result in zip(rows, zip(*values)))
+			summary['contracts'] += len(results['price'])
+			summary['chunks'] += 1
+			if len(results['price']):
+				summary['max_bs_difference'] = max(summary['max_bs_difference'], float(np.max(np.abs(results['price'] - results['bs_price']))))
+
+		header_written = False
+		for fields, rows, columns in contract_chunks(input_path, chunk_size):
+			if not header_written:
+				writer.writerow(list(fields) + list(columns_out))
+				header_written = True
+			pending.append((list(rows), executor.submit(price_contracts, columns, steps, exercise, with_greeks)))
+			while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+				write_oldest()
+
+			if progress is not None and time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+				last_progress = time.perf_counter()
+				progress(summary['contracts'], last_progress - start)
+
+		while pending:
+			write_oldest()
+
+	summary['seconds'] = time.perf_counter() - start
+	summary['contracts_per_second'] = summary['contracts'] / summary['seconds'] if summary['seconds'] > 0 else 0.0
+	return summary
+
+def print_progress(contracts, seconds):
+	print(f"{contracts} contracts priced in {seconds:.1f} s ({contracts / seconds:.0f}/s)", file=sys.stderr)
+
+def main():
+	parser = argparse.ArgumentParser(description="Price a file of contracts on the binomial lattice without the GUI")
+	parser.add_argument("input", help="CSV with the columns S0,K,T,r,sigma,option_type, or a .npy array of them")
+	parser.add_argument("output", help="CSV receiving the input columns followed by the results")
+	parser.add_argument("--steps", type=int, default=200)
+	parser.add_argument("--exercise", choices=("european", "american"), default="european")
+	parser.add_argument("--no-greeks", action="store_true", help="only write the lattice and Black-Scholes prices")
+	parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="contracts read and priced per task")
+	parser.add_argument("--workers", type=int, default=None)
+	parser.add_argument("--quiet", action="store_true", help="no progress lines while pricing")
+	args = parser.parse_args()
+
+	with_greeks = not args.no_greeks
+	if args.steps < (2 if with_greeks else 1):
+		parser.error("--steps must be at least 2 with Greeks, 1 without")
+	if args.chunk_size < 1:
+		parser.error("--chunk-size must be positive")
+
+	try:
+		summary = price_file(args.input, args.output, args.steps, args.exercise, with_greeks, args.chunk_size, args.workers, None if args.quiet else print_progress)
+	except (OSError, ValueError) as error:
+		print(f"error: {error}", file=sys.stderr)
+		return 1
+
+	print(f"Priced {summary['contracts']} contracts in {summary['chunks']} chunks on {summary['workers']} workers")
+	print(f"Time: {summary['seconds']:.2f} s ({summary['contracts_per_second']:.0f} contracts/s)")
+	print(f"Max |lattice - Black-Scholes|: {summary['max_bs_difference']:.6g}")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,113 @@
+import numpy as np
+from binomial_tree import backward_induction, binomial_weights, black_scholes, early_levels, intrinsic_values, lattice_greeks
+
+CHUNK_NODES = 2**16
+MIN_CHUNK_SIZE = 256
+
+def lattice_parameters(T, r, sigma, steps):
+	if steps == 0:
+		ones = np.ones_like(T)
+		return ones, ones, ones * 0.5, ones
+	dt = T / steps
+	u = np.exp(sigma * np.sqrt(dt))
+	d = 1 / u
+	p = (np.exp(r * dt) - d) / (u - d)
+	discount = np.exp(-r * dt)
+	return u, d, p, discount
+
+def chunk_lattice(S0, K, T, r, sigma, is_call, steps, exercise="european"):
+	# The lattice is held as (nodes x contracts) so that each level of the induction is a contiguous block
+	u, d, p, discount = lattice_parameters(T, r, sigma, steps)
+	nodes = np.arange(steps + 1)[:, None]
+	stock_prices = S0 * u ** (steps - nodes) * d ** nodes
+	values = intrinsic_values(stock_prices, K, is_call)
+
+	early_exercise = None
+	if exercise == "american":
+		# S(step, j) = S(step + 1, j) / u, so each level's spot prices come from the previous one with one multiply
+		level_prices = stock_prices.copy()
+		inverse_u = 1 / u
+
+		def early_exercise(step, continuation):
+			current = level_prices[:step + 1]
+			current *= inverse_u
+			np.maximum(continuation, intrinsic_values(current, K, is_call), out=continuation)
+
+	return values, u, d, p, discount, early_exercise
+
+def price_chunk(S0, K, T, r, sigma, is_call, steps, exercise="european"):
+	if exercise == "european":
+		return terminal_sum_chunk(S0, K, T, r, sigma, is_call, steps)
+	values, u, d, p, discount, early_exercise = chunk_lattice(S0, K, T, r, sigma, is_call, steps, exercise)
+	return backward_induction(values, p, discount, early_exercise).copy()
+
+def terminal_sum_chunk(S0, K, T, r, sigma, is_call, steps):
+	# Without early exercise each price is the discounted pmf-weighted sum of the terminal payoffs, O(N) per contract
+	# Contracts whose branch probability falls outside (0, 1) go through the induction, as they do in BinomialTree
+	u, d, p, discount = lattice_parameters(T, r, sigma, steps)
+	nodes = np.arange(steps + 1)[:, None]
+	payoffs = intrinsic_values(S0 * u ** (steps - nodes) * d ** nodes, K, is_call)
+	prices = discount ** steps * np.einsum("ij,ij->j", binomial_weights(steps, p), payoffs)
+
+	degenerate = (p <= 0) | (p >= 1)
+	if np.any(degenerate):
+		chunk = (column[degenerate] for column in (S0, K, T, r, sigma, is_call))
+		values, u, d, p, discount, _ = chunk_lattice(*chunk, steps)
+		prices[degenerate] = backward_induction(values, p, discount)
+	return prices
+
+def greeks_chunk(S0, K, T, r, sigma, is_call, steps, exercise="european"):
+	values, u, d, p, discount, early_exercise = chunk_lattice(S0, K, T, r, sigma, is_call, steps, exercise)
+	price, level1, level2 = early_levels(values, p, discount, early_exercise)
+	return price, lattice_greeks(price, level1, level2, S0, u, d, T / steps)
+
+def contract_columns(S0, K, T, r, sigma, option_type):
+	S0, K, T, r, sigma, option_type = np.broadcast_arrays(
+		np.asarray(S0, dtype=float),
+		np.asarray(K, dtype=float),
+		np.asarray(T, dtype=float),
+		np.asarray(r, dtype=float),
+		np.asarray(sigma, dtype=float),
+		np.asarray(option_type)
+	)
+	shape = S0.shape
+	S0, K, T, r, sigma, option_type = (column.ravel() for column in (S0, K, T, r, sigma, option_type))
+	return shape, S0, K, T, r, sigma, option_type == "call"
+
+def default_chunk_size(steps):
+	return max(MIN_CHUNK_SIZE, CHUNK_NODES // (steps + 1))
+
+def price_batch(S0, K, T, r, sigma, option_type, steps, chunk_size=None, exercise="european"):
+	shape, S0, K, T, r, sigma, is_call = contract_columns(S0, K, T, r, sigma, option_type)
+	chunk_size = chunk_size or default_chunk_size(steps)
+
+	prices = np.empty(S0.size)
+	for start in range(0, S0.size, chunk_size):
+		chunk = slice(start, start + chunk_size)
+		prices[chunk] = price_chunk(S0[chunk], K[chunk], T[chunk], r[chunk], sigma[chunk], is_call[chunk], steps, exercise)
+
+	bs_prices = black_scholes(S0, K, T, r, sigma, is_call)
+	return prices.reshape(shape), bs_prices.reshape(shape)
+
+def greeks_batch(S0, K, T, r, sigma, option_type, steps, bump=1e-4, chunk_size=None, exercise="european"):
+	if steps < 2:
+		raise ValueError("Lattice Greeks need at least 2 steps")
+
+	shape, S0, K, T, r, sigma, is_call = contract_columns(S0, K, T, r, sigma, option_type)
+	chunk_size = chunk_size or default_chunk_size(steps)
+
+	greeks = {name: np.empty(S0.size) for name in ('price', 'delta', 'gamma', 'theta')}
+	for start in range(0, S0.size, chunk_size):
+		chunk = slice(start, start + chunk_size)
+		price, chunk_greeks = greeks_chunk(S0[chunk], K[chunk], T[chunk], r[chunk], sigma[chunk], is_call[chunk], steps, exercise)
+		greeks['price'][chunk] = price
+		for name, values in chunk_greeks.items():
+			greeks[name][chunk] = values
+
+	option_type = np.where(is_call, "call", "put")
+	def bumped(r, sigma):
+		return price_batch(S0, K, T, r, sigma, option_type, steps, chunk_size, exercise)[0]
+
+	greeks['vega'] = (bumped(r, sigma + bump) - bumped(r, sigma - bump)) / (2 * bump)
+	greeks['rho'] = (bumped(r + bump, sigma) - bumped(r - bump, sigma)) / (2 * bump)
+	return {name: values.reshape(shape) for name, values in greeks.items()}
\ No newline at end of file
@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from binomial_tree import BinomialTree, lattice_nodes
+from convergence_sweep import ConvergenceSweep, linear_steps
+
+CONTRACT = {'S0': 100, 'K': 105, 'T': 1.0, 'r': 0.05, 'sigma': 0.25, 'option_type': 'call'}
+CONSTRUCTION_STEPS = (10, 100, 1000, 10000)
+FULL_LATTICE_LIMIT = 1000
+PHASE_STEPS = 1000
+SWEEP_MAX_STEPS = 1000
+SWEEP_STEP_SIZE = 5
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json")
+
+class StandInVar:
+	def __init__(self, value):
+		self.value = value
+
+	def get(self):
+		return self.value
+
+	def set(self, value):
+		self.value = value
+
+class StandInCanvas:
+	# Just enough of tk.Canvas for draw_tree, counting the items it would create
+	def __init__(self, width=1200, height=600):
+		self.width = width
+		self.height = height
+		self.items = 0
+
+	def winfo_width(self):
+		return self.width
+
+	def winfo_height(self):
+		return self.height
+
+	def update_idletasks(self):
+		pass
+
+	def delete(self, *tags):
+		self.items = 0
+
+	def create_item(self, *args, **kwargs):
+		self.items += 1
+		return self.items
+
+	create_oval = create_text = create_line = create_image = create_item
+
+	def move(self, *args):
+		pass
+
+	def scale(self, *args):
+		pass
+
+	def itemconfigure(self, *args, **kwargs):
+		pass
+
+class StandInPhotoImage:
+	def __init__(self, data=None, format=None):
+		self.data = data
+
+def headless_visualizer(steps):
+	from tree_visualizer import TreeVisualizer
+	visualizer = TreeVisualizer.__new__(TreeVisualizer)
+	visualizer.canvas = StandInCanvas()
+	visualizer.tree = BinomialTree(**CONTRACT, steps=steps, max_steps=steps)
+	visualizer.zoom_factor = 1.0
+	visualizer.pan_offset_x = 0
+	visualizer.pan_offset_y = 0
+	visualizer.drawn_region = None
+	visualizer.base_node_radius = 0
+	visualizer.raster_image = None
+	visualizer.raster_layer = None
+	visualizer.option_type_var = StandInVar(CONTRACT['option_type'])
+	visualizer.show_stock_var = StandInVar(True)
+	visualizer.show_most_likely_path_var = StandInVar(True)
+	visualizer.show_profits_var = StandInVar(False)
+	visualizer.show_exercise_boundary_var = StandInVar(False)
+	visualizer.show_surface_var = StandInVar(False)
+	visualizer.surface_layer = None
+	return visualizer
+
+def draw_case(steps, surface=False):
+	import tree_visualizer
+	visualizer = headless_visualizer(steps)
+	visualizer.show_surface_var.set(surface)
+
+	def run():
+		photo_image = tree_visualizer.tk.PhotoImage
+		tree_visualizer.tk.PhotoImage = StandInPhotoImage
+		visualizer.raster_layer = None
+		visualizer.surface_layer = None
+		try:
+			visualizer.draw_tree()
+		finally:
+			tree_visualizer.tk.PhotoImage = photo_image
+		return {'items': visualizer.canvas.items}
+	return run
+
+def phase_case(method):
+	tree = BinomialTree(**CONTRACT, steps=PHASE_STEPS)
+
+	def run():
+		getattr(tree, method)()
+		return {'nodes': lattice_nodes(tree.steps)}
+	return run
+
+def construction_case(steps, price_only, exercise="european"):
+	def run():
+		BinomialTree(**CONTRACT, steps=steps, price_only=price_only, exercise=exercise)
+		return {'nodes': lattice_nodes(steps)}
+	return run
+
+def sweep_case():
+	steps_range = linear_steps(SWEEP_MAX_STEPS, SWEEP_STEP_SIZE)
+
+	def run():
+		with ConvergenceSweep(CONTRACT, cache=None) as sweep:
+			for _ in sweep.run(steps_range):
+				pass
+		return {'points': len(steps_range)}
+	return run
+
+def benchmark_cases():
+	# Cases are built lazily, setup such as building the tree for the phase timings is not measured
+	cases = {}
+	for steps in CONSTRUCTION_STEPS:
+		if steps <= FULL_LATTICE_LIMIT:
+			cases[f"construct/full/{steps}"] = lambda steps=steps: construction_case(steps, False)
+		cases[f"construct/price_only/{steps}"] = lambda steps=steps: construction_case(steps, True)
+		# European price-only trees take the terminal sum, American ones still run the whole induction
+		cases[f"construct/price_only_american/{steps}"] = lambda steps=steps: construction_case(steps, True, "american")
+	for method in ("calculate_prices", "calculate_option_prices", "calculate_profit_values", "find_most_likely_path"):
+		cases[f"phase/{method}/{PHASE_STEPS}"] = lambda method=method: phase_case(method)
+	cases[f"sweep/linear/{SWEEP_MAX_STEPS}"] = sweep_case
+	for steps in (30, 50, 1000):
+		cases[f"draw_tree/{steps}"] = lambda steps=steps: draw_case(steps)
+	cases["draw_tree/surface/1000"] = lambda: draw_case(1000, surface=True)
+	return cases
+
+def measure(run, repeat):
+	timings = []
+	details = {}
+	for _ in range(repeat):
+		start = time.perf_counter()
+		details = run() or {}
+		timings.append(time.perf_counter() - start)
+
+	# Peak memory comes from one extra traced run, tracemalloc would distort the timings
+	tracemalloc.start()
+	try:
+		run()
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+
+	return {'seconds': min(timings), 'median_seconds': statistics.median(timings), 'peak_bytes': peak, **details}
+
+def current_commit():
+	directory = os.path.dirname(os.path.abspath(__file__))
+	try:
+		commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+		dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+	return f"{commit}-dirty" if dirty else commit
+
+def load_results(path):
+	if not os.path.exists(path):
+		return {}
+	with open(path) as file:
+		return json.load(file)
+
+def run_benchmarks(args):
+	cases = benchmark_cases()
+	selected = [name for name in cases if not args.cases or any(pattern in name for pattern in args.cases)]
+	commit = args.label or current_commit()
+
+	results = {}
+	for name in selected:
+		results[name] = measure(cases[name](), args.repeat)
+		print(f"{name:40s} {results[name]['seconds'] * 1000:10.2f} ms {results[name]['peak_bytes'] / 2**20:10.2f} MiB")
+
+	stored = load_results(args.output)
+	stored[commit] = {'timestamp': time.time(), 'python': sys.version.split()[0], 'cases': results}
+	with open(args.output, "w") as file:
+		json.dump(stored, file, indent=2)
+	print(f"Saved results for {commit} to {args.output}")
+	return 0
+
+def compare_benchmarks(args):
+	stored = load_results(args.output)
+	for commit in (args.base, args.target):
+		if commit not in stored:
+			print(f"No results for {commit} in {args.output}")
+			return 2
+
+	base = stored[args.base]['cases']
+	target = stored[args.target]['cases']
+	regressions = []
+	for name in sorted(set(base) & set(target)):
+		for metric in ("seconds", "peak_bytes"):
+			before, after = base[name][metric], target[name][metric]
+			change = (after - before) / before if before else 0.0
+			flag = ""
+			if change > args.threshold:
+				flag = "REGRESSION"
+				regressions.append((name, metric))
+			print(f"{name:40s} {metric:10s} {before:14.6g} -> {after:14.6g} {change * 100:+8.1f}% {flag}")
+
+	print(f"{len(regressions)} regression(s) above {args.threshold * 100:.0f}%")
+	return 1 if regressions else 0
+
+def main():
+	parser = argparse.ArgumentParser(description="Pricing, sweep and rendering benchmarks")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = subparsers.add_parser("run", help="run the suite and store the results under the current commit")
+	run_parser.add_argument("--repeat", type=int, default=3)
+	run_parser.add_argument("--output", default=DEFAULT_RESULTS)
+	run_parser.add_argument("--label", help="store the results under this key instead of the commit")
+	run_parser.add_argument("cases", nargs="*", help="only run cases whose name contains one of these")
+
+	compare_parser = subparsers.add_parser("compare", help="flag cases that got slower or bigger between two stored runs")
+	compare_parser.add_argument("base")
+	compare_parser.add_argument("target")
+	compare_parser.add_argument("--output", default=DEFAULT_RESULTS)
+	compare_parser.add_argument("--threshold", type=float, default=0.15)
+
+	args = parser.parse_args()
+	if args.command == "run":
+		return run_benchmarks(args)
+	return compare_benchmarks(args)
+
+if __name__ == "__main__":
+	sys.exit(main())
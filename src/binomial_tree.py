@@ -1,8 +1,240 @@
+import copy
+import inspect
 import math
-from scipy.stats import norm
+from contextlib import nullcontext
+import numpy as np
+
+erfc = np.frompyfunc(math.erfc, 1, 1)
+
+def normal_cdf(x):
+	# Stdlib erfc keeps the tails accurate without pulling in scipy at import time
+	return 0.5 * np.asarray(erfc(-np.asarray(x, dtype=float) / math.sqrt(2)), dtype=float)
+
+def lattice_nodes(steps):
+	return (steps + 1) * (steps + 2) // 2
+
+def intrinsic_values(stock_prices, K, is_call):
+	return np.where(is_call, np.maximum(stock_prices - K, 0.0), np.maximum(K - stock_prices, 0.0))
+
+def critical_spot(stock_prices, exercised, is_call):
+	# Calls are exercised above the boundary and puts below it, so the critical spot is the exercised node closest to the strike
+	if not exercised.any():
+		return np.nan
+	if is_call:
+		return stock_prices[exercised].min()
+	return stock_prices[exercised].max()
+
+def backward_induction(values, p, discount, early_exercise=None, until=0):
+	# Rolls the terminal values (nodes on the first axis) back to step `until` in place, so only one row of nodes is kept in memory
+	# early_exercise(step, continuation) may overwrite each level in place with its exercise value
+	up = p * discount
+	down = (1 - p) * discount
+	scratch = np.empty_like(values)
+	for step in reversed(range(until, values.shape[0] - 1)):
+		current = values[:step + 1]
+		np.multiply(values[1:step + 2], down, out=scratch[:step + 1])
+		current *= up
+		current += scratch[:step + 1]
+		if early_exercise is not None:
+			early_exercise(step, current)
+	return values[0]
+
+def early_levels(values, p, discount, early_exercise=None):
+	# Rolls back to step 0 keeping copies of levels 1 and 2, which is all the lattice Greeks need
+	backward_induction(values, p, discount, early_exercise, until=2)
+	level2 = values[:3].copy()
+	backward_induction(values[:3], p, discount, early_exercise, until=1)
+	level1 = values[:2].copy()
+	price = backward_induction(values[:2], p, discount, early_exercise).copy()
+	return price, level1, level2
+
+def lattice_greeks(price, level1, level2, S0, u, d, dt):
+	delta = (level1[0] - level1[1]) / (S0 * u - S0 * d)
+	delta_up = (level2[0] - level2[1]) / (S0 * u * u - S0 * u * d)
+	delta_down = (level2[1] - level2[2]) / (S0 * u * d - S0 * d * d)
+	gamma = (delta_up - delta_down) / ((S0 * u * u - S0 * d * d) / 2)
+	theta = (level2[1] - price) / (2 * dt)
+	return {'delta': delta, 'gamma': gamma, 'theta': theta}
+
+def binomial_weights(steps, p):
+	# pmf of the down move count with nodes on the first axis, and one column per contract when p is an array
+	# Built outward from each column's mode with log((N - j) / (j + 1) * (1 - p) / p) increments, so no log factorial is
+	# evaluated and the partial sums stay small where the mass sits; normalising absorbs the log pmf of the mode itself
+	p = np.asarray(p, dtype=float)
+	columns = p.reshape(-1)
+	weights = np.zeros((steps + 1, columns.size))
+	# A branch probability outside (0, 1) leaves a single reachable terminal node
+	weights[0, columns >= 1] = 1.0
+	weights[steps, columns <= 0] = 1.0
+	valid = (columns > 0) & (columns < 1)
+	if steps == 0:
+		weights[0, valid] = 1.0
+	elif valid.any():
+		nodes = np.arange(steps)[:, None]
+		modes = np.clip(((steps + 1) * (1 - columns[valid])).astype(int), 0, steps)
+		increments = np.log((steps - nodes) / (nodes + 1)) + np.log((1 - columns[valid]) / columns[valid])
+		# Increments on the far side of a mode are zeroed, so each cumulative sum starts exactly at its mode
+		log_weights = np.zeros((steps + 1, modes.size))
+		log_weights[1:] += np.cumsum(np.where(nodes >= modes, increments, 0.0), axis=0)
+		log_weights[:-1] -= np.cumsum(np.where(nodes < modes, increments, 0.0)[::-1], axis=0)[::-1]
+		log_weights = np.exp(log_weights - log_weights.max(axis=0))
+		weights[:, valid] = log_weights / log_weights.sum(axis=0)
+	return weights.reshape((steps + 1,) + p.shape)
+
+def most_likely_path(steps, terminal_node):
+	# Every path into a node is equally likely, the predecessor odds C(s-1, c) / C(s-1, c-1) = (s - c) / c
+	# only depend on the position, so the path is traced back without any probability table; ties step down to node - 1
+	path = [terminal_node]
+	node = terminal_node
+	for step in reversed(range(1, steps + 1)):
+		if node == step or (node > 0 and 2 * node >= step):
+			node -= 1
+		path.append(node)
+	return list(reversed(path))
+
+def pruned_band(steps, p, sigmas):
+	# Node ranges within `sigmas` terminal standard deviations of the expected node at each step; the width is the
+	# terminal one throughout, so each step's band holds all but at most one child on either side of the band before it
+	width = sigmas * math.sqrt(steps * p * (1 - p))
+	positions = np.arange(steps + 1)
+	expected = positions * (1 - p)
+	low = np.clip(np.floor(expected - width), 0, positions).astype(int)
+	high = np.clip(np.ceil(expected + width), 0, positions).astype(int)
+	return low, high
+
+def interpolate_level(log_prices, values, log_spots):
+	# Linear in log spot between the nodes of one level, NaN outside the spots the level reaches
+	order = np.argsort(log_prices)
+	log_prices = log_prices[order]
+	values = np.asarray(values, dtype=float)[order]
+	interpolated = np.interp(log_spots, log_prices, values)
+	tolerance = 1e-12 * max(1.0, abs(log_prices[-1]))
+	interpolated[(log_spots < log_prices[0] - tolerance) | (log_spots > log_prices[-1] + tolerance)] = np.nan
+	return interpolated
+
+def peizer_pratt(z, n):
+	# Returns the inversion and its complement; the one below 1/2 is computed without cancellation, so contracts deep in
+	# or out of the money keep an accurate 1 - p instead of one rounded to zero
+	tail = math.exp(-(z / (n + 1/3 + 0.1 / (n + 1)))**2 * (n + 1/6))
+	root = math.sqrt(0.25 - 0.25 * tail)
+	small = 0.25 * tail / (0.5 + root)
+	return (0.5 + root, small) if z >= 0 else (small, 0.5 + root)
+
+def crr_parameters(T, r, sigma, steps):
+	dt = T / steps
+	u = math.exp(sigma * math.sqrt(dt))
+	d = 1 / u
+	return u, d, (math.exp(r * dt) - d) / (u - d)
+
+def leisen_reimer_parameters(S0, K, T, r, sigma, steps):
+	# Branch probabilities are the Peizer-Pratt inversions of d2 and d1, which puts the strike on the middle node for odd
+	# step counts only; even counts converge noticeably slower, so callers wanting LR accuracy should pass an odd N
+	d1 = (math.log(S0 / K) + (r + sigma**2 / 2) * T) / (sigma * math.sqrt(T))
+	d2 = d1 - sigma * math.sqrt(T)
+	p, q = peizer_pratt(d2, steps)
+	p1, q1 = peizer_pratt(d1, steps)
+	if min(p, q, p1, q1) <= 0:
+		# With |d2| far beyond sqrt(N) the inversion saturates and the lattice degenerates, CRR still prices it
+		return crr_parameters(T, r, sigma, steps)
+	growth = math.exp(r * T / steps)
+	return growth * p1 / p, growth * q1 / q, p
+
+def black_scholes(S0, K, T, r, sigma, is_call):
+	S0, K, T, r, sigma, is_call = np.broadcast_arrays(S0, K, T, r, sigma, is_call)
+	d1 = (np.log(S0 / K) + (r + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+	d2 = d1 - sigma * np.sqrt(T)
+	call = S0 * normal_cdf(d1) - K * np.exp(-r * T) * normal_cdf(d2)
+	put = K * np.exp(-r * T) * normal_cdf(-d2) - S0 * normal_cdf(-d1)
+	return np.where(is_call, call, put)
+
+SCHEMES = ("crr", "lr", "bbs", "richardson")
+
+# Stages in dependency order, invalidating one invalidates every later one
+STAGES = ("parameters", "prices", "option_prices", "profit_values", "most_likely_path")
+PRICE_ONLY_STAGES = ("parameters", "option_prices")
+STAGE_ATTRIBUTES = {
+	'parameters': ("u", "d", "p", "discount"),
+	'prices': ("prices",),
+	'option_prices': ("option_values", "option_price", "exercise_boundary", "truncation_error"),
+	'profit_values': ("profit_values",),
+	'most_likely_path': ("most_likely_path", "most_likely_payoff", "most_likely_prob", "most_likely_profit")
+}
+ATTRIBUTE_STAGES = {attribute: stage for stage, attributes in STAGE_ATTRIBUTES.items() for attribute in attributes}
+# First stage a parameter change invalidates, None for parameters no stage reads
+PARAMETER_STAGES = {
+	'S0': "prices",
+	'K': "option_prices",
+	'T': "parameters",
+	'r': "parameters",
+	'sigma': "parameters",
+	'steps': "parameters",
+	'option_type': "option_prices",
+	'max_steps': None,
+	'price_only': "prices",
+	'exercise': "option_prices",
+	'scheme': "parameters",
+	'stats': None,
+	'dtype': "prices",
+	'prune_sigmas': "option_prices"
+}
+STAGE_METHODS = {
+	'parameters': "calculate_tree_parameters",
+	'prices': "calculate_prices",
+	'option_prices': "calculate_option_prices",
+	'profit_values': "calculate_profit_values",
+	'most_likely_path': "find_most_likely_path"
+}
+
+class TriangularLattice:
+	# Row `step` holds nodes 0..step at offset step * (step + 1) / 2 of one contiguous array, rows are returned as views
+	# so lattice[step][node] reads like the nested lists did
+	def __init__(self, steps, dtype=np.float64, data=None):
+		self.steps = steps
+		self.data = np.zeros(lattice_nodes(steps), dtype=dtype) if data is None else data
+
+	def offset(self, step):
+		if step < 0:
+			step += self.steps + 1
+		if not 0 <= step <= self.steps:
+			raise IndexError(f"step {step} outside a lattice of {self.steps} steps")
+		return step * (step + 1) // 2, step
+
+	def row(self, step):
+		start, step = self.offset(step)
+		return self.data[start:start + step + 1]
+
+	def __getitem__(self, index):
+		if isinstance(index, tuple):
+			step, node = index
+			start, step = self.offset(step)
+			if not 0 <= node <= step:
+				raise IndexError(f"node {node} outside step {step}")
+			return self.data[start + node]
+		return self.row(index)
+
+	def __setitem__(self, step, values):
+		self.row(step)[:] = values
+
+	def __len__(self):
+		return self.steps + 1
+
+	def __iter__(self):
+		return (self.row(step) for step in range(self.steps + 1))
+
+	@property
+	def nbytes(self):
+		return self.data.nbytes
+
+	def tolist(self):
+		return [row.tolist() for row in self]
 
 class BinomialTree:
-	def __init__(self, S0, K, T, r, sigma, steps, option_type, max_steps=30):
+	def __init__(self, S0, K, T, r, sigma, steps, option_type, max_steps=30, price_only=False, exercise="european", scheme="crr", stats=None, dtype=np.float64, prune_sigmas=None):
+		# Stages are computed eagerly here; after a parameter change only the stages depending on it are recomputed, on first access
+		self.valid = set()
+		self.rescale = None
+		# Trees handed out by a TreeCache are shared and refuse parameter changes, derive() gives a private copy instead
+		self.shared = False
 		self.S0 = S0
 		self.K = K
 		self.T = T
@@ -11,26 +243,117 @@ class BinomialTree:
 		self.steps = steps
 		self.option_type = option_type
 		self.max_steps = max_steps
-		self.calculate_tree_parameters()
-		self.calculate_prices()
-		self.calculate_option_prices()
-		self.find_most_likely_path()
+		self.price_only = price_only
+		self.exercise = exercise
+		self.scheme = scheme
+		# Storage type of the lattices, float32 halves their memory while the induction itself always runs in float64
+		self.dtype = np.dtype(dtype)
+		# Optional TreeStats collecting wall time, allocations and node counts per phase
+		self.stats = stats
+		# Price-only trees can skip nodes beyond this many terminal standard deviations, see pruned_induction
+		self.prune_sigmas = prune_sigmas
+		self.refresh()
+
+	def __setattr__(self, name, value):
+		if name == "dtype":
+			value = np.dtype(value)
+		if name in PARAMETER_STAGES and name in self.__dict__ and value != self.__dict__[name]:
+			if self.shared:
+				raise AttributeError(f"Cannot change {name} of a cached tree, change a copy from derive() instead")
+			self.parameter_changed(name, self.__dict__[name], value)
+		object.__setattr__(self, name, value)
+
+	def __getattr__(self, name):
+		# Only reached for attributes missing from the instance, which for stage outputs means they were invalidated
+		stage = ATTRIBUTE_STAGES.get(name)
+		if stage is None or stage not in self.stages():
+			raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+		self.ensure(stage)
+		try:
+			return self.__dict__[name]
+		except KeyError:
+			raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'") from None
+
+	def parameter_changed(self, name, old, new):
+		stage = PARAMETER_STAGES[name]
+		if self.scheme == "lr" and name in ("S0", "K"):
+			# Leisen-Reimer places the strike on the lattice, so its u, d and p depend on both
+			stage = "parameters"
+		if stage is None:
+			return
+
+		if name == "S0" and stage == "prices":
+			# Every node is proportional to S0, so the last lattice is rescaled instead of rebuilt
+			if "prices" in self.__dict__:
+				rescale = (self.__dict__["prices"], new / old)
+			elif self.rescale is not None:
+				rescale = (self.rescale[0], self.rescale[1] * new / old)
+			else:
+				rescale = None
+			self.invalidate(stage)
+			self.rescale = rescale
+			return
+		self.invalidate(stage)
+
+	def stages(self):
+		return PRICE_ONLY_STAGES if self.price_only else STAGES
+
+	def invalidate(self, stage):
+		for name in STAGES[STAGES.index(stage):]:
+			self.valid.discard(name)
+			for attribute in STAGE_ATTRIBUTES[name]:
+				self.__dict__.pop(attribute, None)
+		if STAGES.index(stage) <= STAGES.index("prices"):
+			self.rescale = None
+
+	def ensure(self, stage):
+		stages = self.stages()
+		for name in stages[:stages.index(stage) + 1]:
+			if name not in self.valid:
+				getattr(self, STAGE_METHODS[name])()
+				self.valid.add(name)
+
+	def refresh(self):
+		self.ensure(self.stages()[-1])
+		return self
+
+	def update(self, **params):
+		unknown = sorted(set(params) - set(PARAMETER_STAGES))
+		if unknown:
+			raise TypeError(f"Unknown tree parameters {', '.join(unknown)}")
+		for name, value in params.items():
+			setattr(self, name, value)
+		return self
+
+	def derive(self, **params):
+		# Shallow copy sharing every stage the changes leave valid; stages always assign new arrays, never write into
+		# old ones, so the original tree is left untouched
+		tree = copy.copy(self)
+		object.__setattr__(tree, "shared", False)
+		object.__setattr__(tree, "valid", set(self.valid))
+		return tree.update(**params)
+
+	def phase(self, name, nodes):
+		return self.stats.phase(name, nodes) if self.stats is not None else nullcontext()
 
 	def calculate_prices(self):
-		self.prices = []
-		for step in range(self.steps + 1):
-			step_prices = []
-			for j in range(step + 1):
-				price = self.S0 * (self.u ** (step - j)) * (self.d ** j)
-				step_prices.append(price)
-			self.prices.append(step_prices)
+		with self.phase("calculate_prices", lattice_nodes(self.steps)):
+			if self.rescale is not None:
+				prices, scale = self.rescale
+				self.prices = TriangularLattice(self.steps, data=(prices.data * scale).astype(self.dtype, copy=False))
+				self.rescale = None
+				return
+			self.prices = TriangularLattice(self.steps, self.dtype)
+			for step in range(self.steps + 1):
+				self.prices[step] = self.level_prices(step)
 
 	def calculate_tree_parameters(self):
 		if self.steps > 0:
 			dt = self.T / self.steps
-			self.u = math.exp(self.sigma * math.sqrt(dt))
-			self.d = 1 / self.u
-			self.p = (math.exp(self.r * dt) - self.d) / (self.u - self.d)
+			if self.scheme == "lr":
+				self.u, self.d, self.p = leisen_reimer_parameters(self.S0, self.K, self.T, self.r, self.sigma, self.steps)
+			else:
+				self.u, self.d, self.p = crr_parameters(self.T, self.r, self.sigma, self.steps)
 			self.discount = math.exp(-self.r * dt)
 		else:
 			self.u = 1.0
@@ -38,71 +361,341 @@ class BinomialTree:
 			self.p = 0.5
 			self.discount = 1.0
 
+	def level_prices(self, step):
+		return self.node_prices(step, np.arange(step + 1))
+
+	def node_prices(self, step, nodes):
+		return self.S0 * self.u ** (step - nodes) * self.d ** nodes
+
+	def node_at(self, step, spot):
+		# Spots beyond the level, such as a strike outside the terminal range, map to its outermost node
+		node = round((step * math.log(self.u) - math.log(spot / self.S0)) / (math.log(self.u) - math.log(self.d)))
+		return min(max(node, 0), step)
+
+	def terminal_payoffs(self):
+		return intrinsic_values(self.level_prices(self.steps), self.K, self.option_type == "call")
+
+	def smoothed(self):
+		return self.scheme in ("bbs", "richardson") and self.steps > 0
+
+	def smoothed_values(self):
+		# Black-Scholes over the last interval replaces the induction from the payoff kink at the penultimate step
+		step = self.steps - 1
+		values = black_scholes(self.level_prices(step), self.K, self.T / self.steps, self.r, self.sigma, self.option_type == "call")
+		if self.exercise == "american":
+			self.apply_early_exercise(step, values)
+		return values
+
+	def initial_values(self):
+		return self.smoothed_values() if self.smoothed() else self.terminal_payoffs()
+
+	def extrapolate(self, price):
+		# Two-point Richardson on the smoothed tree, whose error is monotone in 1/N
+		if self.scheme != "richardson" or self.steps < 2:
+			return price
+		coarse_steps = self.steps // 2
+		coarse = self.bumped_tree(steps=coarse_steps, scheme="bbs")
+		self.truncation_error = (self.steps * self.truncation_error + coarse_steps * coarse.truncation_error) / (self.steps - coarse_steps)
+		return (self.steps * price - coarse_steps * coarse.option_price) / (self.steps - coarse_steps)
+
+	def apply_early_exercise(self, step, continuation):
+		stock_prices = self.level_prices(step)
+		intrinsic = intrinsic_values(stock_prices, self.K, self.option_type == "call")
+		self.exercise_boundary[step] = critical_spot(stock_prices, intrinsic > continuation, self.option_type == "call")
+		np.maximum(continuation, intrinsic, out=continuation)
+
 	def calculate_option_prices(self):
-		self.option_values = [[0] * (i+1) for i in range(self.steps + 1)]
+		early_exercise = None
+		self.exercise_boundary = None
+		if self.exercise == "american":
+			early_exercise = self.apply_early_exercise
+			self.exercise_boundary = np.full(self.steps + 1, np.nan)
+			# At expiry every paying node is exercised, NaN when none pays
+			stock_prices = self.level_prices(self.steps)
+			is_call = self.option_type == "call"
+			self.exercise_boundary[self.steps] = critical_spot(stock_prices, intrinsic_values(stock_prices, self.K, is_call) > 0, is_call)
+
+		self.truncation_error = 0.0
+		# Validated before an engine is picked, so the same arguments are rejected whichever engine would run
+		if self.prune_sigmas is not None:
+			if not self.price_only:
+				raise ValueError("Pruning only applies to price-only trees")
+			if self.prune_sigmas <= 0:
+				raise ValueError("prune_sigmas must be positive")
 
-		for i in range(self.steps + 1):
-			stock_price = self.prices[self.steps][i]
+		if self.price_only and self.exercise == "european" and self.steps > 0 and 0 < self.p < 1:
+			with self.phase("terminal_sum", self.steps + 1):
+				self.option_price = self.extrapolate(self.terminal_sum())
+			return
+
+		if self.prune_sigmas is not None:
+			self.option_price = self.extrapolate(self.pruned_induction(early_exercise))
+			return
+
+		if self.price_only:
+			# The price-only engine has no separate lattices, so its own stages are reported as phases
+			with self.phase("initial_values", self.steps + 1):
+				values = self.initial_values()
+			with self.phase("backward_induction", lattice_nodes(len(values) - 1)):
+				price = float(backward_induction(values, self.p, self.discount, early_exercise))
+			with self.phase("extrapolate", lattice_nodes(self.steps // 2) if self.scheme == "richardson" and self.steps >= 2 else 0):
+				self.option_price = self.extrapolate(price)
+			return
+
+		with self.phase("calculate_option_prices", lattice_nodes(self.steps)):
+			self.option_values = TriangularLattice(self.steps, self.dtype)
+			for step, level in self.induction_levels():
+				self.option_values[step] = level
+			self.option_price = self.extrapolate(float(level[0]))
+
+	def terminal_sum(self):
+		# Without early exercise the root is the discounted pmf-weighted sum of one level, O(N) instead of O(N^2); it is exact,
+		# so pruning has nothing left to save. Only nodes with a weight that survives exp() are summed, and for plain payoffs
+		# only those on the paying side of the strike
+		last_step = self.steps - 1 if self.smoothed() else self.steps
+		weights = binomial_weights(last_step, self.p)
+		support = np.flatnonzero(weights)
+		first, last = int(support[0]), int(support[-1])
+
+		if self.smoothed():
+			nodes = np.arange(first, last + 1)
+			values = black_scholes(self.node_prices(last_step, nodes), self.K, self.T / self.steps, self.r, self.sigma, self.option_type == "call")
+		else:
+			# Node j pays on the call side while (N - j) log u + j log d > log(K / S0)
+			crossing = (last_step * math.log(self.u) - math.log(self.K / self.S0)) / (math.log(self.u) - math.log(self.d))
 			if self.option_type == "call":
-				self.option_values[self.steps][i] = max(0, stock_price - self.K)
-			elif self.option_type == "put":
-				self.option_values[self.steps][i] = max(0, self.K - stock_price)
+				last = min(last, math.floor(crossing) + 1)
+			else:
+				first = max(first, math.ceil(crossing) - 1)
+			if first > last:
+				return 0.0
+			nodes = np.arange(first, last + 1)
+			values = intrinsic_values(self.node_prices(last_step, nodes), self.K, self.option_type == "call")
+		return float(self.discount ** last_step * np.dot(weights[first:last + 1], values))
 
-		for step in reversed(range(self.steps)):
-			for i in range(step + 1):
-				self.option_values[step][i] = (self.p * self.option_values[step+1][i] + (1 - self.p) * self.option_values[step+1][i+1]) * self.discount
+	def forward_intrinsic(self, step, nodes):
+		# Children outside the pruned band take max(S - K*df, 0) for calls and max(K*df - S, 0) for puts, df discounting to
+		# expiry, floored at intrinsic for American exercise. On a risk-neutral lattice the true value never falls below it
+		# and exceeds it by at most min(S, K*df), or S for American calls and K for American puts, which is the bound returned
+		stock_prices = self.node_prices(step, nodes)
+		strike = self.K * self.discount ** (self.steps - step)
+		is_call = self.option_type == "call"
+		values = intrinsic_values(stock_prices, strike, is_call)
+		if self.exercise == "american":
+			np.maximum(values, intrinsic_values(stock_prices, self.K, is_call), out=values)
+			bounds = stock_prices if is_call else np.full(np.shape(stock_prices), float(self.K))
+		else:
+			bounds = np.minimum(stock_prices, strike)
+		return values, bounds
 
-		self.option_price = self.option_values[0][0]
+	def pruned_exercise(self, step, nodes, continuation):
+		stock_prices = self.node_prices(step, nodes)
+		intrinsic = intrinsic_values(stock_prices, self.K, self.option_type == "call")
+		self.exercise_boundary[step] = critical_spot(stock_prices, intrinsic > continuation, self.option_type == "call")
+		np.maximum(continuation, intrinsic, out=continuation)
 
-		self.profit_values = [[0] * (i+1) for i in range(self.steps + 1)]
-		for step in range(self.steps + 1):
-			for node in range(step + 1):
-				self.profit_values[step][node] = self.option_values[step][node] - self.option_price
+	def pruned_induction(self, early_exercise):
+		# Only the band from pruned_band is rolled back, O(N * k * sqrt(N)) nodes instead of O(N^2). The induction and the
+		# max of early exercise are both 1-Lipschitz, so rolling the fill bounds back the same way bounds the price error
+		low, high = pruned_band(self.steps, self.p, self.prune_sigmas)
+		last_step = self.steps - 1 if self.smoothed() else self.steps
+		is_call = self.option_type == "call"
 
-	def find_most_likely_path(self):
-		probs = [[0] * (i+1) for i in range(self.steps + 1)]
-		probs[0][0] = 1.0
-
-		for step in range(1, self.steps+1):
-			for node in range(step + 1):
-				prob = 0
-				if node < step:
-					prob += probs[step-1][node] * self.p
-				if node > 0:
-					prob += probs[step-1][node-1] * (1 - self.p)
-				probs[step][node] = prob
-
-		path = []
-		current_node = probs[self.steps].index(max(probs[self.steps]))
-		path.append(current_node)
-
-		for step in reversed(range(1, self.steps+1)):
-			prob_from_up = 0
-			prob_from_down = 0
-
-			if current_node < step:
-				prob_from_up = probs[step-1][current_node] * self.p
-			if current_node > 0:
-				prob_from_down = probs[step-1][current_node-1] * (1 - self.p)
-
-			if prob_from_up > prob_from_down:
-				current_node = current_node
+		# Rows hold values and their error bounds indexed by node, so the band slides along them without copying
+		lattice = np.zeros((2, last_step + 2))
+		with self.phase("initial_values", int(high[last_step] - low[last_step] + 1)):
+			nodes = np.arange(low[last_step], high[last_step] + 1)
+			if self.smoothed():
+				values = black_scholes(self.node_prices(last_step, nodes), self.K, self.T / self.steps, self.r, self.sigma, is_call)
+				if early_exercise is not None:
+					self.pruned_exercise(last_step, nodes, values)
 			else:
-				current_node -= 1
-
-			path.append(current_node)
-		
-		self.most_likely_path = list(reversed(path))
-		self.most_likely_payoff = self.option_values[self.steps][probs[self.steps].index(max(probs[self.steps]))]
-		self.most_likely_prob = probs[self.steps][probs[self.steps].index(max(probs[self.steps]))]
-		self.most_likely_profit = self.profit_values[self.steps][probs[self.steps].index(max(probs[self.steps]))]
-	
-	def black_scholes_price(self):
-		if self.option_type == "call":
-			d1 = (math.log(self.S0 / self.K) + (self.r + self.sigma**2 / 2) * self.T) / (self.sigma * math.sqrt(self.T))
-			d2 = d1 - self.sigma * math.sqrt(self.T)
-			return self.S0 * norm.cdf(d1) - self.K * math.exp(-self.r * self.T) * norm.cdf(d2)
+				values = intrinsic_values(self.node_prices(last_step, nodes), self.K, is_call)
+			lattice[0, nodes] = values
+
+		# Children run from low[step] to high[step] + 1 and the band of step + 1 misses at most one at each end,
+		# those fills are computed for every step at once
+		steps = np.arange(last_step)
+		left = (low[1:last_step + 1] > low[:last_step]).tolist()
+		right = (high[1:last_step + 1] <= high[:last_step]).tolist()
+		left_fill = np.array(self.forward_intrinsic(steps + 1, low[:last_step]))
+		right_fill = np.array(self.forward_intrinsic(steps + 1, high[:last_step] + 1))
+
+		up = self.p * self.discount
+		down = (1 - self.p) * self.discount
+		scratch = np.empty_like(lattice)
+		with self.phase("backward_induction", int(np.sum(high[:last_step] - low[:last_step] + 1))):
+			for step, first, last in zip(reversed(range(last_step)), reversed(low[:last_step].tolist()), reversed(high[:last_step].tolist())):
+				if left[step]:
+					lattice[:, first] = left_fill[:, step]
+				if right[step]:
+					lattice[:, last + 1] = right_fill[:, step]
+				current = lattice[:, first:last + 1]
+				np.multiply(lattice[:, first + 1:last + 2], down, out=scratch[:, :last - first + 1])
+				current *= up
+				current += scratch[:, :last - first + 1]
+				if early_exercise is not None:
+					self.pruned_exercise(step, np.arange(first, last + 1), current[0])
+
+		self.truncation_error = float(lattice[1, 0])
+		return float(lattice[0, 0])
+
+	def induction_levels(self):
+		# Yields (step, values) from expiry back to the root; each level is computed in float64 from the one after it,
+		# whatever the storage type, and is only valid until the next one is requested
+		early_exercise = self.apply_early_exercise if self.exercise == "american" else None
+		level = self.terminal_payoffs()
+		yield self.steps, level
+
+		last_step = self.steps
+		if self.smoothed():
+			last_step = self.steps - 1
+			level = self.smoothed_values()
+			yield last_step, level
+
+		for step in reversed(range(last_step)):
+			level = (self.p * level[:-1] + (1 - self.p) * level[1:]) * self.discount
+			if early_exercise is not None:
+				early_exercise(step, level)
+			yield step, level
+
+	def calculate_profit_values(self):
+		with self.phase("calculate_profit_values", lattice_nodes(self.steps)):
+			self.profit_values = TriangularLattice(self.steps, data=(self.option_values.data - self.option_price).astype(self.dtype, copy=False))
+
+	def value_surface(self, spots=None, times=None, spot_points=60, time_points=100):
+		# Level k of the lattice already holds values at spots S0 * u^(k-j) * d^j with T - k*dt to expiry, so the surface
+		# is read off the stored rows, or off a single induction for price-only trees, instead of repricing each point
+		if self.steps < 1:
+			raise ValueError("A value surface needs at least 1 step")
+		dt = self.T / self.steps
+
+		if spots is None:
+			# The terminal cone is far wider than anything reachable, so the default range stops at 4 standard deviations
+			spread = 4 * self.sigma * math.sqrt(self.T)
+			low = max(self.S0 * math.exp(-spread), self.S0 * self.d ** self.steps)
+			high = min(self.S0 * math.exp(spread), self.S0 * self.u ** self.steps)
+			spots = np.geomspace(low, high, spot_points)
+		if times is None:
+			times = np.linspace(0, self.T, time_points)
+		spots = np.asarray(spots, dtype=float)
+		times = np.asarray(times, dtype=float)
+
+		# Times between two levels are interpolated linearly between them
+		positions = np.clip((self.T - times) / dt, 0, self.steps)
+		lower = np.floor(positions).astype(int)
+		upper = np.minimum(lower + 1, self.steps)
+		weight = positions - lower
+		needed = set(lower.tolist()) | set(upper.tolist())
+
+		if self.price_only:
+			levels = self.induction_levels()
+		else:
+			levels = ((step, self.option_values[step]) for step in range(self.steps + 1))
+		log_spots = np.log(spots)
+		rows = {}
+		for step, level in levels:
+			if step in needed:
+				rows[step] = interpolate_level(np.log(self.level_prices(step)), level, log_spots)
+
+		lower_values = np.array([rows[step] for step in lower.tolist()]).reshape(len(times), len(spots))
+		upper_values = np.array([rows[step] for step in upper.tolist()]).reshape(len(times), len(spots))
+		with np.errstate(invalid="ignore"):
+			values = np.where(weight[:, None] == 0, lower_values, lower_values + weight[:, None] * (upper_values - lower_values))
+
+		return {
+			'spots': spots,
+			'times': times,
+			'values': values,
+			'profits': values - self.option_price
+		}
+
+	def find_most_likely_path(self):
+		with self.phase("find_most_likely_path", self.steps + 1):
+			distribution = self.terminal_distribution(quantiles=())
+			mode = distribution['mode']
+
+			self.most_likely_path = most_likely_path(self.steps, mode)
+			self.most_likely_payoff = float(self.option_values[self.steps, mode])
+			self.most_likely_prob = distribution['mode_probability']
+			self.most_likely_profit = float(self.profit_values[self.steps, mode])
+
+	def terminal_distribution(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+		probabilities = binomial_weights(self.steps, self.p)
+		mode = int(np.argmax(probabilities))
+		payoffs = self.terminal_payoffs()
+
+		# Payoffs are monotone in the node but in opposite directions for calls and puts, so quantiles go through a sort
+		order = np.argsort(payoffs, kind="stable")
+		cumulative = np.cumsum(probabilities[order])
+		payoff_quantiles = {q: float(payoffs[order][min(np.searchsorted(cumulative, q), self.steps)]) for q in quantiles}
+
+		return {
+			'probabilities': probabilities,
+			'mode': mode,
+			'mode_probability': float(probabilities[mode]),
+			'payoffs': payoffs,
+			'expected_payoff': float(np.dot(probabilities, payoffs)),
+			'payoff_quantiles': payoff_quantiles
+		}
+
+	def greeks(self, bump=1e-4):
+		if self.steps < 2:
+			raise ValueError("Lattice Greeks need at least 2 steps")
+
+		early_exercise = self.apply_early_exercise if self.exercise == "american" else None
+		if self.price_only or self.dtype != np.float64:
+			# Reduced precision lattices are too coarse for the differences behind gamma, so the levels are recomputed
+			values = self.initial_values()
+			if len(values) < 3:
+				raise ValueError("Lattice Greeks need at least 2 steps before the smoothed level")
+			price, level1, level2 = early_levels(values, self.p, self.discount, early_exercise)
 		else:
-			d1 = (math.log(self.S0 / self.K) + (self.r + self.sigma**2 / 2) * self.T) / (self.sigma * math.sqrt(self.T))
-			d2 = d1 - self.sigma * math.sqrt(self.T)
-			return self.K * math.exp(-self.r * self.T) * norm.cdf(-d2) - self.S0 * norm.cdf(-d1)
\ No newline at end of file
+			price = float(self.option_values[0, 0])
+			level1 = self.option_values[1].astype(float)
+			level2 = self.option_values[2].astype(float)
+
+		greeks = {'price': self.option_price}
+		greeks.update({name: float(value) for name, value in lattice_greeks(price, level1, level2, self.S0, self.u, self.d, self.T / self.steps).items()})
+		greeks['vega'] = (self.bumped_price(sigma=self.sigma + bump) - self.bumped_price(sigma=self.sigma - bump)) / (2 * bump)
+		greeks['rho'] = (self.bumped_price(r=self.r + bump) - self.bumped_price(r=self.r - bump)) / (2 * bump)
+		return greeks
+
+	def bumped_price(self, **bumps):
+		return self.bumped_tree(**bumps).option_price
+
+	def bumped_tree(self, **bumps):
+		# Same contract and lattice size with some parameters shifted, priced through the O(N) memory engine
+		params = {
+			'S0': self.S0,
+			'K': self.K,
+			'T': self.T,
+			'r': self.r,
+			'sigma': self.sigma,
+			'steps': self.steps,
+			'option_type': self.option_type,
+			'exercise': self.exercise,
+			'scheme': self.scheme,
+			'prune_sigmas': self.prune_sigmas
+		}
+		params.update(bumps)
+		return BinomialTree(**params, price_only=True)
+
+	def black_scholes_price(self):
+		return float(black_scholes(self.S0, self.K, self.T, self.r, self.sigma, self.option_type == "call"))
+
+def check_stage_tables(cls):
+	# Invalidation is driven entirely by these tables, so a constructor argument or stage missing from them would
+	# silently keep serving stale results after a change; checked once at import instead
+	arguments = set(inspect.signature(cls.__init__).parameters) - {"self"}
+	if arguments != set(PARAMETER_STAGES):
+		raise TypeError(f"PARAMETER_STAGES must list exactly the arguments of {cls.__name__}, differs on {', '.join(sorted(arguments ^ set(PARAMETER_STAGES)))}")
+	for table in (STAGE_ATTRIBUTES, STAGE_METHODS):
+		if set(table) != set(STAGES):
+			raise TypeError(f"Stage tables must cover exactly the stages {', '.join(STAGES)}")
+	unknown = [stage for stage in PARAMETER_STAGES.values() if stage is not None and stage not in STAGES]
+	missing = [method for method in STAGE_METHODS.values() if not callable(getattr(cls, method, None))]
+	if unknown or missing:
+		raise TypeError(f"Unknown stages {unknown} or missing stage methods {missing}")
+
+check_stage_tables(BinomialTree)
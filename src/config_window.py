@@ -1,7 +1,5 @@
 import tkinter as tk
 from tkinter import ttk
-from binomial_tree import BinomialTree
-from tree_visualizer import TreeVisualizer
 
 
 class ConfigWindow:
@@ -107,6 +105,10 @@ class ConfigWindow:
         style.configure('TButton', padding=6)
     
     def create_tree(self):
+        # Imported here so the menu opens without loading NumPy and the visualizer
+        from binomial_tree import BinomialTree
+        from tree_visualizer import TreeVisualizer
+
         self.root.withdraw()
        
         tree = BinomialTree(
@@ -117,7 +119,7 @@ class ConfigWindow:
             sigma=self.sigma_var.get(),
             steps=self.steps_var.get(),
             option_type=self.option_type_var.get(),
-            max_steps=50
+            max_steps=TreeVisualizer.MAX_STEPS
         )
         
         self.viewer_window = tk.Toplevel(self.root)
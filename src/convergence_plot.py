@@ -4,28 +4,49 @@ import matplotlib
 matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-from binomial_tree import BinomialTree
+from binomial_tree import SCHEMES
+from convergence_sweep import ConvergenceSweep, geometric_steps, linear_steps, time_to_accuracy
+from sweep_store import shared_store
+from tree_stats import TreeStats
+import bisect
+import heapq
+import queue
+import threading
 import time
 from datetime import datetime
 
 class ConvergencePlot:
+	POLL_INTERVAL = 50
+	MAX_GEOMETRIC_POINTS = 100
+	BREAKDOWN_INTERVAL = 0.5
+
 	def __init__(self, parent, tree_params):
 		self.parent = parent
 		self.tree_params = tree_params
 		self.convergence_data = None
+		self.results = None
+		self.cancel_event = None
+		self.background = None
+		self.ax2 = None
+		self.time_ax = None
+		self.price_line = None
+		self.error_line = None
+		self.sweep_stats = None
+		self.breakdown_drawn = 0.0
 		self.setup_ui()
 
 	def setup_ui(self):
 		self.window = tk.Toplevel(self.parent)
 		self.window.title("Convergence Plot")
 		self.window.geometry("800x600")
+		self.window.protocol("WM_DELETE_WINDOW", self.on_close)
 
 		control_frame = ttk.Frame(self.window, padding=10)
 		control_frame.pack(side=tk.TOP, fill=tk.X)
 
 		ttk.Label(control_frame, text="Max steps: ").grid(row=0, column=0, padx=5)
 		self.max_steps_var = tk.IntVar(value=100)
-		ttk.Spinbox(control_frame, from_=1, to=1000, textvariable=self.max_steps_var, width=5).grid(row=0, column=1, padx=5)
+		ttk.Spinbox(control_frame, from_=1, to=100000, textvariable=self.max_steps_var, width=7).grid(row=0, column=1, padx=5)
 
 		ttk.Label(control_frame, text="Step size: ").grid(row=0, column=2, padx=5)
 		self.step_size_var = tk.IntVar(value=5)
@@ -33,12 +54,32 @@ class ConvergencePlot:
 
 		ttk.Button(control_frame, text="Plot", command=self.plot_convergence).grid(row=0, column=4, padx=10)
 
-		ttk.Button(control_frame, text="Export to CSV", command=self.export_data).grid(row=0, column=5, padx=5)
+		self.cancel_button = ttk.Button(control_frame, text="Cancel", command=self.cancel_sweep, state=tk.DISABLED)
+		self.cancel_button.grid(row=0, column=5, padx=5)
+
+		ttk.Button(control_frame, text="Export to CSV", command=self.export_data).grid(row=0, column=6, padx=5)
+
+		self.progress = ttk.Progressbar(control_frame, mode="determinate", length=150)
+		self.progress.grid(row=0, column=7, padx=10)
+
+		ttk.Label(control_frame, text="Spacing: ").grid(row=1, column=0, padx=5, pady=(5, 0))
+		self.spacing_var = tk.StringVar(value="linear")
+		ttk.Combobox(control_frame, textvariable=self.spacing_var, values=["linear", "geometric", "adaptive"], state="readonly", width=9).grid(row=1, column=1, padx=5, pady=(5, 0))
+
+		ttk.Label(control_frame, text="Tolerance: ").grid(row=1, column=2, padx=5, pady=(5, 0))
+		self.tolerance_var = tk.DoubleVar(value=1e-3)
+		ttk.Entry(control_frame, textvariable=self.tolerance_var, width=7).grid(row=1, column=3, padx=5, pady=(5, 0))
+
+		ttk.Button(control_frame, text="Compare schemes", command=self.compare_schemes).grid(row=1, column=4, columnspan=2, padx=10, pady=(5, 0))
+
+		self.breakdown_var = tk.BooleanVar(value=False)
+		ttk.Checkbutton(control_frame, text="Time breakdown", variable=self.breakdown_var).grid(row=1, column=6, columnspan=2, padx=5, pady=(5, 0), sticky="w")
 
 		self.fig = Figure(figsize=(10,6), dpi=100)
 		self.ax = self.fig.add_subplot(111)
 
 		self.canvas = FigureCanvasTkAgg(self.fig, master=self.window)
+		self.canvas.mpl_connect("draw_event", self.on_draw)
 		self.canvas.draw()
 		self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
@@ -46,45 +87,159 @@ class ConvergencePlot:
 		self.info_label.pack(side=tk.BOTTOM, pady=10)
 
 	def plot_convergence(self):
+		self.cancel_sweep()
+
 		max_steps = self.max_steps_var.get()
 		step_size = self.step_size_var.get()
-		steps_range = list(range(1, max_steps+1, step_size))
+		spacing = self.spacing_var.get()
+		steps_range = linear_steps(max_steps, step_size)
+		if spacing == "geometric":
+			steps_range = geometric_steps(max_steps, min(len(steps_range), self.MAX_GEOMETRIC_POINTS))
+
+		breakdown = self.breakdown_var.get()
+		if breakdown:
+			# Cached prices carry no timings, so an instrumented sweep prices every step count itself
+			sweep = ConvergenceSweep(self.tree_params, cache=None, stats=TreeStats(), store=shared_store)
+		else:
+			sweep = ConvergenceSweep(self.tree_params, store=shared_store)
+		self.sweep_stats = sweep.stats
+		bs_price = sweep.bs_price
+		if spacing == "adaptive":
+			tolerance = self.tolerance_var.get()
+			plan = lambda: sweep.adaptive(max_steps, tolerance=tolerance)
+		else:
+			plan = lambda: sweep.run(steps_range)
 
 		self.convergence_data = {
-			'steps_range': steps_range,
+			'steps_range': [],
 			'binomial_prices': [],
 			'bs_prices': [],
 			'errors': [],
+			'phase_seconds': [],
 			'tree_params': self.tree_params.copy(),
 			'timestamp': time.time()
 		}
 
+		self.setup_plot(max_steps, bs_price, breakdown)
+
+		self.results = queue.Queue()
+		self.cancel_event = threading.Event()
+		worker = threading.Thread(target=self.run_sweep, args=(sweep, plan, self.results, self.cancel_event), daemon=True)
+
+		self.progress_determinate = spacing != "adaptive"
+		if spacing == "adaptive":
+			self.progress.config(mode="indeterminate")
+			self.progress.start()
+		else:
+			self.progress.config(mode="determinate", maximum=len(steps_range), value=0)
+		self.cancel_button.config(state=tk.NORMAL)
 		self.info_label.config(text="Calculating...")
-		self.window.update()
+		self.start = time.time()
+
+		worker.start()
+		self.window.after(self.POLL_INTERVAL, self.poll_results, self.results)
 
-		start = time.time()
+	@staticmethod
+	def run_sweep(sweep, plan, results, cancel_event):
+		# Runs on a worker thread and only talks to the UI through the results queue, None marks the end of the sweep
+		try:
+			for steps, option_price, error in plan():
+				if cancel_event.is_set():
+					break
+				stats = sweep.step_stats.get(steps)
+				results.put((steps, option_price, sweep.bs_price, stats.seconds() if stats is not None else None))
+		finally:
+			sweep.close()
+			results.put(None)
 
-		for steps in steps_range:
-			tree = BinomialTree(**self.tree_params, steps=steps)
-			option_price = tree.option_price
-			bs_price = tree.black_scholes_price()
-			self.convergence_data['binomial_prices'].append(option_price)
-			self.convergence_data['bs_prices'].append(bs_price)
-			self.convergence_data['errors'].append(abs(option_price - bs_price))
+	def poll_results(self, results):
+		if results is not self.results:
+			return
 
-		self.ax.clear()
-		if hasattr(self, "ax2"):
-			self.ax2.remove()
+		finished = False
+		received = False
+		while True:
+			try:
+				result = results.get_nowait()
+			except queue.Empty:
+				break
+			if result is None:
+				finished = True
+				break
+			# Workers finish out of order, so each result is inserted at its place in the step ordering
+			steps, option_price, bs_price, phase_seconds = result
+			index = bisect.bisect(self.convergence_data['steps_range'], steps)
+			self.convergence_data['steps_range'].insert(index, steps)
+			self.convergence_data['binomial_prices'].insert(index, option_price)
+			self.convergence_data['bs_prices'].insert(index, bs_price)
+			self.convergence_data['errors'].insert(index, abs(option_price - bs_price))
+			self.convergence_data['phase_seconds'].insert(index, phase_seconds)
+			received = True
 
+		# Restacking the breakdown needs a full redraw, so it is throttled instead of following every result
+		refresh = self.time_ax is not None and (finished or time.time() - self.breakdown_drawn >= self.BREAKDOWN_INTERVAL)
+		if refresh:
+			self.update_breakdown()
+
+		if (received or refresh) and self.convergence_data['steps_range']:
+			if self.progress_determinate:
+				self.progress.config(value=len(self.convergence_data['steps_range']))
+			self.update_lines(redraw=refresh)
+
+		if finished:
+			self.finish_sweep(f"{len(self.convergence_data['steps_range'])} points")
+		else:
+			self.window.after(self.POLL_INTERVAL, self.poll_results, results)
+
+	def cancel_sweep(self):
+		if self.cancel_event is not None:
+			self.cancel_event.set()
+
+	def finish_sweep(self, computed):
+		end = time.time()
+		self.results = None
+		self.cancel_button.config(state=tk.DISABLED)
+		self.progress.stop()
+
+		if self.cancel_event.is_set():
+			self.info_label.config(text=f"Cancelled after {computed} ({end - self.start:.2f} seconds)")
+		else:
+			self.info_label.config(text=f"Time taken: {end - self.start:.2f} seconds")
+
+	def on_close(self):
+		self.cancel_sweep()
+		self.results = None
+		self.window.destroy()
+
+	def reset_axes(self, breakdown=False):
+		self.fig.clear()
+		self.background = None
+		self.ax2 = None
+		self.time_ax = None
+		self.price_line = None
+		self.error_line = None
+		if breakdown:
+			grid = self.fig.add_gridspec(2, 1, height_ratios=(3, 2))
+			self.ax = self.fig.add_subplot(grid[0])
+			self.time_ax = self.fig.add_subplot(grid[1], sharex=self.ax)
+		else:
+			self.ax = self.fig.add_subplot(111)
+
+	def setup_plot(self, max_steps, bs_price, breakdown=False):
+		self.reset_axes(breakdown)
 		self.ax2 = self.ax.twinx()
 
-		self.ax.plot(steps_range, self.convergence_data['binomial_prices'], 'b-', label='Binomial price', marker='o', markersize=3)
-		self.ax.axhline(y=self.convergence_data['bs_prices'][0], color='r', linestyle='--', label=f'Black-Scholes: {self.convergence_data["bs_prices"][0]:.4f}')
+		self.price_line, = self.ax.plot([], [], 'b-', label='Binomial price', marker='o', markersize=3, animated=True)
+		self.ax.axhline(y=bs_price, color='r', linestyle='--', label=f'Black-Scholes: {bs_price:.4f}')
 
-		self.ax2.plot(steps_range, self.convergence_data['errors'], 'g-', linewidth=1, label='Error', alpha=0.7)
+		self.error_line, = self.ax2.plot([], [], 'g-', linewidth=1, label='Error', alpha=0.7, animated=True)
 		self.ax2.set_ylabel('Error', color='g')
 		self.ax2.tick_params(axis='y', labelcolor='g')
 
+		self.ax.set_xlim(0, max_steps + 1)
+		self.ax.set_ylim(bs_price * 0.99, bs_price * 1.01)
+		self.ax2.set_ylim(0, 1e-6)
+
 		self.ax.set_xlabel("Steps")
 		self.ax.set_ylabel("Option price")
 		self.ax.set_title("Convergence Plot for the Binomial Tree Pricing Model with Black-Scholes formula")
@@ -92,17 +247,154 @@ class ConvergencePlot:
 		self.ax.grid(True, alpha=0.3)
 		self.ax2.legend(loc='upper right')
 
+		if self.time_ax is not None:
+			self.time_ax.set_xlabel("Steps")
+			self.time_ax.set_ylabel("Time per price (ms)")
+			self.time_ax.grid(True, alpha=0.3)
+			self.breakdown_drawn = time.time()
+
 		self.fig.tight_layout()
 		self.canvas.draw()
-		end = time.time()
 
-		self.info_label.config(text=f"Time taken: {end - start:.2f} seconds")
+	def update_breakdown(self):
+		# Stacked wall time of each pricing phase against the step count, only for the step counts that were instrumented
+		timed = [(steps, seconds) for steps, seconds in zip(self.convergence_data['steps_range'], self.convergence_data['phase_seconds']) if seconds is not None]
+		for collection in list(self.time_ax.collections):
+			collection.remove()
+		self.breakdown_drawn = time.time()
+		if not timed:
+			return
+
+		phases = list(dict.fromkeys(name for _, seconds in timed for name in seconds))
+		steps_range = [steps for steps, _ in timed]
+		stacks = [[seconds.get(name, 0.0) * 1000 for _, seconds in timed] for name in phases]
+		self.time_ax.stackplot(steps_range, *stacks, labels=phases, alpha=0.8)
+		self.time_ax.legend(loc='upper left', fontsize='small')
+		self.time_ax.relim()
+		self.time_ax.autoscale(axis='y')
+
+	def update_lines(self, redraw=False):
+		steps_range = self.convergence_data['steps_range']
+		self.price_line.set_data(steps_range, self.convergence_data['binomial_prices'])
+		self.error_line.set_data(steps_range, self.convergence_data['errors'])
+
+		rescaled = self.expand_limits(self.ax, self.convergence_data['binomial_prices'])
+		rescaled = self.expand_limits(self.ax2, self.convergence_data['errors']) or rescaled
+
+		# A change of limits invalidates the cached background, otherwise only the two lines are blitted
+		if redraw or rescaled or self.background is None:
+			self.canvas.draw()
+		else:
+			self.canvas.restore_region(self.background)
+			self.draw_lines()
+			self.canvas.blit(self.fig.bbox)
+
+	@staticmethod
+	def expand_limits(axis, values):
+		low, high = min(values), max(values)
+		bottom, top = axis.get_ylim()
+		if bottom <= low and high <= top:
+			return False
+		margin = (high - low) * 0.1 or abs(high) * 0.1 or 1.0
+		axis.set_ylim(min(bottom, low - margin), max(top, high + margin))
+		return True
+
+	def on_draw(self, event):
+		self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+		self.draw_lines()
+
+	def draw_lines(self):
+		if self.price_line is not None:
+			self.ax.draw_artist(self.price_line)
+			self.ax2.draw_artist(self.error_line)
+
+	def compare_schemes(self):
+		self.cancel_sweep()
+
+		max_steps = self.max_steps_var.get()
+		tolerance = self.tolerance_var.get()
+		steps_range = geometric_steps(max_steps, self.MAX_GEOMETRIC_POINTS // 2)
+
+		self.reset_axes()
+		self.ax.set_xlim(1, max_steps)
+		self.ax.set_ylim(tolerance / 10, tolerance * 10)
+		self.ax.set_xscale("log")
+		self.ax.set_yscale("log")
+		self.ax.axhline(y=tolerance, color='r', linestyle='--', label=f'Tolerance: {tolerance:g}')
+		self.ax.set_xlabel("Steps")
+		self.ax.set_ylabel("Error vs Black-Scholes")
+		self.ax.set_title("Convergence of the lattice schemes")
+		self.ax.grid(True, which="both", alpha=0.3)
+		self.canvas.draw()
+
+		self.results = queue.Queue()
+		self.cancel_event = threading.Event()
+		worker = threading.Thread(target=self.run_comparison, args=(self.tree_params.copy(), steps_range, tolerance, self.results, self.cancel_event), daemon=True)
+
+		self.progress_determinate = True
+		self.progress.config(mode="determinate", maximum=len(SCHEMES), value=0)
+		self.cancel_button.config(state=tk.NORMAL)
+		self.info_label.config(text="Comparing schemes...")
+		self.scheme_results = []
+		self.start = time.time()
+
+		worker.start()
+		self.window.after(self.POLL_INTERVAL, self.poll_comparison, self.results)
+
+	@staticmethod
+	def run_comparison(tree_params, steps_range, tolerance, results, cancel_event):
+		try:
+			for scheme in SCHEMES:
+				scheme_params = {**tree_params, 'scheme': scheme}
+				# Leisen-Reimer only centers the strike on odd lattices
+				scheme_steps = sorted({steps | 1 for steps in steps_range}) if scheme == "lr" else steps_range
+				with ConvergenceSweep(scheme_params, store=shared_store) as sweep:
+					for _ in sweep.run(scheme_steps):
+						if cancel_event.is_set():
+							return
+					computed = sorted(sweep.prices)
+					errors = [sweep.error(steps) for steps in computed]
+				results.put((scheme, computed, errors, time_to_accuracy(scheme_params, computed, errors, tolerance)))
+		finally:
+			results.put(None)
+
+	def poll_comparison(self, results):
+		if results is not self.results:
+			return
+
+		finished = False
+		while True:
+			try:
+				result = results.get_nowait()
+			except queue.Empty:
+				break
+			if result is None:
+				finished = True
+				break
+
+			scheme, steps_range, errors, (accurate_steps, seconds) = result
+			self.scheme_results.append(result)
+			if accurate_steps is None:
+				label = f"{scheme}: tolerance not reached"
+			else:
+				label = f"{scheme}: N={accurate_steps} in {seconds * 1000:.1f} ms"
+			self.ax.plot(steps_range, errors, linewidth=1, marker='o', markersize=2, label=label)
+			self.ax.legend(loc='upper right')
+			self.ax.relim()
+			self.ax.autoscale()
+			self.progress.config(value=len(self.scheme_results))
+			self.canvas.draw()
+
+		if finished:
+			self.finish_sweep(f"{len(self.scheme_results)} schemes")
+		else:
+			self.window.after(self.POLL_INTERVAL, self.poll_comparison, results)
 
 	def export_data(self):
 		import csv
 		from tkinter import filedialog
 
-		if not self.convergence_data['binomial_prices']:
+		if not self.convergence_data or not self.convergence_data['binomial_prices']:
 			self.info_label.config(text="No data to export. Calculate convergence first.")
 			return
 
@@ -115,14 +407,32 @@ class ConvergencePlot:
 				writer.writerow([f"# Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
 				writer.writerow([f"# Parameters: S0={self.tree_params['S0']}, K={self.tree_params['K']}, T={self.tree_params['T']}, r={self.tree_params['r']}, sigma={self.tree_params['sigma']}, option_type={self.tree_params['option_type']}"])
 				writer.writerow("")
-				writer.writerow(['steps', 'binomial_prices', 'bs_prices', 'error', 'relative_error'])
-				
-				for i, step in enumerate(self.convergence_data['steps_range']):
-					binomial = self.convergence_data['binomial_prices'][i]
-					bs = self.convergence_data['bs_prices'][i]
-					error = self.convergence_data['errors'][i]
+				phases = list(dict.fromkeys(name for seconds in self.convergence_data['phase_seconds'] if seconds for name in seconds))
+				writer.writerow(['steps', 'binomial_prices', 'bs_prices', 'error', 'relative_error'] + [f"{name}_seconds" for name in phases])
+
+				# Prices stream from the sweep store, restricted to the plotted step counts; the store only holds what the
+				# sweep has saved so far, so plotted points not on disk yet are merged in from the plotted lists
+				bs = self.convergence_data['bs_prices'][0]
+				phase_by_steps = dict(zip(self.convergence_data['steps_range'], self.convergence_data['phase_seconds']))
+				stored = shared_store.iter_rows(self.tree_params, self.convergence_data['steps_range'])
+				plotted = list(zip(self.convergence_data['steps_range'], self.convergence_data['binomial_prices']))
+				rows = 0
+				previous = None
+				for step, binomial in heapq.merge(stored, plotted, key=lambda row: row[0]):
+					if step == previous:
+						continue
+					previous = step
+					error = abs(binomial - bs)
 					relative_error = error / bs if bs != 0 else 0
+					phase_seconds = phase_by_steps.get(step) or {}
+
+					writer.writerow([step, binomial, bs, error, relative_error] + [phase_seconds.get(name, "") for name in phases])
+					rows += 1
 
-					writer.writerow([step, binomial, bs, error, relative_error])
+				if self.sweep_stats is not None and self.sweep_stats.phases:
+					writer.writerow("")
+					writer.writerow(["# Phase totals over the sweep"])
+					writer.writerow(TreeStats.ROW_HEADER)
+					writer.writerows(self.sweep_stats.rows())
 
-			self.info_label.config(text=f"Data exported to {filename}")
\ No newline at end of file
+			self.info_label.config(text=f"{rows} rows exported to {filename}")
\ No newline at end of file
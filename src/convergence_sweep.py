@@ -0,0 +1,183 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from binomial_tree import BinomialTree
+from tree_cache import shared_cache
+from tree_stats import TreeStats
+
+SAVE_INTERVAL = 2.0
+
+def price_steps(tree_params, steps, stats=None):
+	return BinomialTree(**tree_params, steps=steps, price_only=True, stats=stats)
+
+def linear_steps(max_steps, step_size):
+	return list(range(1, max_steps + 1, step_size))
+
+def geometric_steps(max_steps, points, min_steps=1):
+	return sorted(set(int(round(steps)) for steps in np.geomspace(min_steps, max_steps, points)))
+
+def split_parity(steps_range):
+	odd = [steps for steps in steps_range if steps % 2 == 1]
+	even = [steps for steps in steps_range if steps % 2 == 0]
+	return odd, even
+
+def time_to_accuracy(tree_params, steps_range, errors, tolerance):
+	# First swept step count after which the error stays within tolerance, with the wall time of one price at that size
+	accurate = None
+	for steps, error in reversed(list(zip(steps_range, errors))):
+		if error > tolerance:
+			break
+		accurate = steps
+	if accurate is None:
+		return None, None
+
+	start = time.perf_counter()
+	BinomialTree(**tree_params, steps=accurate, price_only=True)
+	return accurate, time.perf_counter() - start
+
+class ConvergenceSweep:
+	def __init__(self, tree_params, workers=None, cache=shared_cache, stats=None, store=None):
+		self.tree_params = dict(tree_params)
+		self.bs_price = BinomialTree(**self.tree_params, steps=0, price_only=True).black_scholes_price()
+		self.workers = workers or os.cpu_count() or 1
+		self.cache = cache
+		self.prices = {}
+		self.executor = None
+		# With a TreeStats every priced step count keeps its own phase stats, and the sweep total is aggregated into stats
+		self.stats = stats
+		self.step_stats = {}
+		# With a SweepStore earlier sweeps of the contract are loaded up front and new prices are written back after each run,
+		# except that instrumented sweeps price everything themselves so each step count gets its timings
+		self.store = store
+		self.unsaved = {}
+		self.last_save = time.perf_counter()
+		if store is not None and stats is None:
+			self.prices.update(store.load(self.tree_params))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown(wait=False, cancel_futures=True)
+			self.executor = None
+
+	def error(self, steps):
+		return abs(self.prices[steps] - self.bs_price)
+
+	def run(self, steps_range):
+		# Yields (steps, price, error) in completion order, step counts already priced by this sweep or the cache are not recomputed
+		steps_range = list(dict.fromkeys(steps_range))
+		for steps in steps_range:
+			if steps not in self.prices and self.cache is not None:
+				tree = self.cache.lookup(**self.tree_params, steps=steps, price_only=True)
+				if tree is not None:
+					self.prices[steps] = tree.option_price
+					self.unsaved[steps] = tree.option_price
+			if steps in self.prices:
+				yield steps, self.prices[steps], self.error(steps)
+
+		pending = sorted((steps for steps in steps_range if steps not in self.prices), reverse=True)
+		if not pending:
+			self.save()
+			return
+
+		if self.executor is None:
+			self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+		# Largest lattices are submitted first so the pool is not left waiting on one long job at the end
+		futures = [self.executor.submit(price_steps, self.tree_params, steps, self.tree_stats()) for steps in pending]
+		try:
+			for future in as_completed(futures):
+				tree = future.result()
+				self.prices[tree.steps] = tree.option_price
+				self.unsaved[tree.steps] = tree.option_price
+				if tree.stats is not None:
+					self.step_stats[tree.steps] = tree.stats
+					self.stats.merge(tree.stats)
+				if self.cache is not None:
+					self.cache.put(tree)
+				yield tree.steps, tree.option_price, self.error(tree.steps)
+				if time.perf_counter() - self.last_save >= SAVE_INTERVAL:
+					self.save()
+		finally:
+			for future in futures:
+				future.cancel()
+			self.save()
+
+	def save(self):
+		self.last_save = time.perf_counter()
+		if self.store is None or not self.unsaved:
+			return
+		try:
+			self.store.save(self.tree_params, self.unsaved)
+		except OSError:
+			# A read-only or full disk only costs the next sweep a recomputation
+			return
+		self.unsaved = {}
+
+	def tree_stats(self):
+		if self.stats is None:
+			return None
+		return TreeStats(track_memory=self.stats.track_memory)
+
+	def adaptive(self, max_steps, tolerance=None, points=16, threshold=0.25, max_rounds=8):
+		# Coarse geometric grid with an odd and an even point around each node, priced in ascending blocks until
+		# the error of a whole block is below tolerance, then refined wherever the log error jumps between neighbours
+		grid = sorted(set(steps + offset for steps in geometric_steps(max_steps, points) for offset in (0, 1) if steps + offset <= max_steps))
+
+		computed = []
+		for start in range(0, len(grid), self.workers):
+			block = grid[start:start + self.workers]
+			yield from self.run(block)
+			computed.extend(block)
+			if tolerance is not None and max(self.error(steps) for steps in block) < tolerance:
+				break
+
+		for _ in range(max_rounds):
+			refinements = []
+			for series in split_parity(computed):
+				refinements.extend(self.refinements(series, threshold))
+			if not refinements:
+				break
+			yield from self.run(refinements)
+			computed = sorted(set(computed) | set(refinements))
+
+	def refinements(self, series, threshold):
+		refinements = []
+		for low, high in zip(series, series[1:]):
+			if high - low <= 2:
+				continue
+			change = abs(math.log10(max(self.error(high), 1e-300)) - math.log10(max(self.error(low), 1e-300)))
+			if change <= threshold:
+				continue
+			middle = int(round(math.sqrt(low * high)))
+			if middle % 2 != low % 2:
+				middle += 1 if middle + 1 < high else -1
+			if low < middle < high:
+				refinements.append(middle)
+		return refinements
+
+	def series(self):
+		computed = sorted(self.prices)
+		odd, even = split_parity(computed)
+		return {
+			name: {
+				'steps_range': steps_range,
+				'binomial_prices': [self.prices[steps] for steps in steps_range],
+				'errors': [self.error(steps) for steps in steps_range]
+			}
+			for name, steps_range in (('odd', odd), ('even', even))
+		}
+
+	def stats_rows(self):
+		# Per step count phase stats followed by the sweep totals, step counts served from the cache have none
+		rows = [[steps] + row for steps in sorted(self.step_stats) for row in self.step_stats[steps].rows()]
+		if self.stats is not None:
+			rows.extend(['total'] + row for row in self.stats.rows())
+		return rows
@@ -0,0 +1,98 @@
+import math
+import time
+import numpy as np
+from batch_pricing import contract_columns, price_batch
+from binomial_tree import black_scholes
+
+SIGMA_BOUNDS = (1e-4, 5.0)
+VEGA_BUMP = 1e-5
+
+def black_scholes_vega(S0, K, T, r, sigma):
+	d1 = (np.log(S0 / K) + (r + sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+	return S0 * np.exp(-d1**2 / 2) / math.sqrt(2 * math.pi) * np.sqrt(T)
+
+def initial_guess(S0, K, T, r):
+	# Manaster-Koehler starting point, the inflection of the price in sigma, from where Newton converges monotonically
+	# At the money it degenerates to zero, so it is floored with a plain 20% guess
+	return np.maximum(np.sqrt(2 * np.abs(np.log(S0 / K) + r * T) / T), 0.2)
+
+def solve_volatility(price, vega, targets, sigma, tolerance, max_iterations, bounds=SIGMA_BOUNDS):
+	# Safeguarded Newton over all contracts at once: price(index, sigma) and vega(index, sigma, prices) only see the
+	# contracts still running, each one keeps a bracket and falls back to bisection when the Newton step leaves it
+	sigma = np.clip(np.asarray(sigma, dtype=float), *bounds).copy()
+	low = np.full(sigma.shape, bounds[0])
+	high = np.full(sigma.shape, bounds[1])
+	converged = np.zeros(sigma.shape, dtype=bool)
+	iterations = np.zeros(sigma.shape, dtype=int)
+	active = np.arange(sigma.size)
+
+	for _ in range(max_iterations):
+		if active.size == 0:
+			break
+		prices = price(active, sigma[active])
+		difference = prices - targets[active]
+		iterations[active] += 1
+
+		done = np.abs(difference) < tolerance
+		converged[active[done]] = True
+
+		above = difference > 0
+		high[active[above]] = sigma[active[above]]
+		low[active[~above]] = sigma[active[~above]]
+
+		running = ~done
+		active = active[running]
+		if active.size == 0:
+			break
+
+		slopes = vega(active, sigma[active], prices[running])
+		with np.errstate(divide="ignore", invalid="ignore"):
+			step = sigma[active] - difference[running] / slopes
+		inside = np.isfinite(step) & (step > low[active]) & (step < high[active])
+		sigma[active] = np.where(inside, step, (low[active] + high[active]) / 2)
+
+	return sigma, converged, iterations
+
+def black_scholes_implied_vol(targets, S0, K, T, r, is_call, tolerance=1e-10, max_iterations=50):
+	def price(index, sigma):
+		return black_scholes(S0[index], K[index], T[index], r[index], sigma, is_call[index])
+
+	def vega(index, sigma, prices):
+		return black_scholes_vega(S0[index], K[index], T[index], r[index], sigma)
+
+	return solve_volatility(price, vega, targets, initial_guess(S0, K, T, r), tolerance, max_iterations)
+
+def implied_volatility(prices, S0, K, T, r, option_type, steps, exercise="european", tolerance=1e-6, max_iterations=30, chunk_size=None):
+	start = time.perf_counter()
+	targets, S0, K, T, r, option_type = np.broadcast_arrays(np.asarray(prices, dtype=float), S0, K, T, r, np.asarray(option_type))
+	shape, S0, K, T, r, _, is_call = contract_columns(S0, K, T, r, 0.0, option_type)
+	targets = targets.ravel()
+	option_type = np.where(is_call, "call", "put")
+	evaluations = [0]
+
+	# The Black-Scholes solve is cheap and lands close to the lattice root, so the tree only has a few Newton steps left
+	warm_start, _, _ = black_scholes_implied_vol(targets, S0, K, T, r, is_call)
+
+	def price(index, sigma):
+		evaluations[0] += 1
+		return price_batch(S0[index], K[index], T[index], r[index], sigma, option_type[index], steps, chunk_size, exercise)[0]
+
+	def vega(index, sigma, prices):
+		return (price(index, sigma + VEGA_BUMP) - prices) / VEGA_BUMP
+
+	sigma, converged, iterations = solve_volatility(price, vega, targets, warm_start, tolerance, max_iterations)
+	sigma = np.where(converged, sigma, np.nan)
+
+	return {
+		'sigma': sigma.reshape(shape),
+		'converged': converged.reshape(shape),
+		'iterations': iterations.reshape(shape),
+		'report': {
+			'contracts': int(converged.size),
+			'converged': int(converged.sum()),
+			'max_iterations': int(iterations.max(initial=0)),
+			'mean_iterations': float(iterations.mean()) if iterations.size else 0.0,
+			'batch_evaluations': evaluations[0],
+			'seconds': time.perf_counter() - start
+		}
+	}
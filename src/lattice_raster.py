@@ -0,0 +1,64 @@
+import itertools
+import numpy as np
+from binomial_tree import TriangularLattice
+
+BACKGROUND = (255, 255, 255)
+PALE = (235, 235, 235)
+
+def flatten_lattice(rows):
+	if isinstance(rows, TriangularLattice):
+		return np.asarray(rows.data, dtype=float)
+	steps = len(rows) - 1
+	return np.fromiter(itertools.chain.from_iterable(rows), dtype=float, count=(steps + 1) * (steps + 2) // 2)
+
+def raster_nodes(width, height, steps, x_spacing, y_spacing, center_y, zoom, pan_x, pan_y):
+	# Flat index of the nearest lattice node for every pixel of the viewport, -1 where the pixel is off the triangle
+	base_x = (np.arange(width) - pan_x) / zoom
+	base_y = (np.arange(height) - pan_y) / zoom
+	step = np.rint(base_x / x_spacing - 1).astype(np.int64)
+	node = np.rint((base_y[:, None] - center_y) / y_spacing + step / 2).astype(np.int64)
+	inside = (step >= 0) & (step <= steps) & (node >= 0) & (node <= step)
+	return np.where(inside, step * (step + 1) // 2 + node, -1)
+
+def value_colors(values, high_color, low_color, peak=None):
+	# Positive values shade from pale to high_color with their size relative to peak (the largest of values unless
+	# given), the others take low_color like the drawn nodes
+	colors = np.empty((values.size, 3), dtype=np.uint8)
+	colors[:] = low_color
+	positive = values > 0
+	if positive.any():
+		weight = (values[positive] / (values[positive].max() if peak is None else peak))[:, None]
+		colors[positive] = np.array(PALE) + (np.array(high_color) - np.array(PALE)) * weight
+	return colors
+
+def gradient_colors(values, low_color, high_color, low=None, high=None):
+	low = values.min() if low is None else low
+	high = values.max() if high is None else high
+	weight = ((values - low) / (high - low) if high > low else np.zeros_like(values))[:, None]
+	return (np.array(low_color) + (np.array(high_color) - np.array(low_color)) * weight).astype(np.uint8)
+
+def render_rgb(index, colors):
+	rgb = np.empty(index.shape + (3,), dtype=np.uint8)
+	rgb[:] = BACKGROUND
+	inside = index >= 0
+	rgb[inside] = colors[index[inside]]
+	return rgb
+
+def render_pixels(index, values, colorize):
+	# Like render_rgb, but only the nodes under the viewport are colored, one lookup per pixel instead of per node
+	rgb = np.empty(index.shape + (3,), dtype=np.uint8)
+	rgb[:] = BACKGROUND
+	inside = index >= 0
+	rgb[inside] = colorize(values[index[inside]])
+	return rgb
+
+def ppm_data(rgb):
+	height, width, _ = rgb.shape
+	return b"P6\n%d %d\n255\n" % (width, height) + rgb.tobytes()
+
+def surface_rgb(grid, cell, high_color, low_color):
+	# Each grid cell becomes a cell x cell block of pixels, NaN cells (outside the lattice) are left as background
+	finite = np.isfinite(grid)
+	colors = value_colors(np.where(finite, grid, 0.0).ravel(), high_color, low_color)
+	index = np.where(finite, np.arange(grid.size).reshape(grid.shape), -1)
+	return render_rgb(np.repeat(np.repeat(index, cell, axis=0), cell, axis=1), colors)
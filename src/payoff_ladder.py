@@ -0,0 +1,87 @@
+import numpy as np
+from batch_pricing import lattice_parameters
+from binomial_tree import backward_induction, black_scholes, normal_cdf
+
+PAYOFF_KINDS = ("call", "put", "straddle", "digital_call", "digital_put")
+
+def payoff_kernel(kind, spots, strikes):
+	# (nodes x strikes) payoffs of one kind, digitals pay 1 strictly in the money
+	spots = spots[:, None]
+	if kind == "call":
+		return np.maximum(spots - strikes, 0.0)
+	if kind == "put":
+		return np.maximum(strikes - spots, 0.0)
+	if kind == "straddle":
+		return np.abs(spots - strikes)
+	if kind == "digital_call":
+		return (spots > strikes).astype(float)
+	return (spots < strikes).astype(float)
+
+def payoff_columns(kinds):
+	# Column indices of each kind, so every kernel is evaluated once over all of its strikes
+	return {kind: np.flatnonzero(kinds == kind) for kind in PAYOFF_KINDS if np.any(kinds == kind)}
+
+def payoff_values(columns, spots, strikes, out=None):
+	values = np.empty((len(spots), len(strikes))) if out is None else out
+	for kind, index in columns.items():
+		values[:, index] = payoff_kernel(kind, spots, strikes[index])
+	return values
+
+def payoff_black_scholes(kinds, strikes, S0, T, r, sigma):
+	references = np.empty(len(strikes))
+	for kind, index in payoff_columns(kinds).items():
+		K = strikes[index]
+		if kind in ("call", "put"):
+			references[index] = black_scholes(S0, K, T, r, sigma, kind == "call")
+		elif kind == "straddle":
+			references[index] = black_scholes(S0, K, T, r, sigma, True) + black_scholes(S0, K, T, r, sigma, False)
+		else:
+			d2 = (np.log(S0 / K) + (r - sigma**2 / 2) * T) / (sigma * np.sqrt(T))
+			references[index] = np.exp(-r * T) * normal_cdf(d2 if kind == "digital_call" else -d2)
+	return references
+
+def price_payoffs(S0, T, r, sigma, steps, payoffs, exercise="european"):
+	# One stock lattice for every (kind, strike) pair; the induction runs on a (nodes x payoffs) matrix so each
+	# level is one vectorised update for the whole set
+	kinds = np.array([kind for kind, _ in payoffs])
+	strikes = np.array([strike for _, strike in payoffs], dtype=float)
+	unknown = sorted(set(kinds.tolist()) - set(PAYOFF_KINDS))
+	if unknown:
+		raise ValueError(f"Unknown payoff kinds {', '.join(unknown)}, expected one of {', '.join(PAYOFF_KINDS)}")
+
+	u, d, p, discount = lattice_parameters(T, r, sigma, steps)
+	nodes = np.arange(steps + 1)
+	level_prices = S0 * u ** (steps - nodes) * d ** nodes
+	columns = payoff_columns(kinds)
+	values = payoff_values(columns, level_prices, strikes)
+
+	early_exercise = None
+	if exercise == "american":
+		inverse_u = 1 / u
+		scratch = np.empty_like(values)
+
+		def early_exercise(step, continuation):
+			current = level_prices[:step + 1]
+			current *= inverse_u
+			np.maximum(continuation, payoff_values(columns, current, strikes, scratch[:step + 1]), out=continuation)
+
+	prices = backward_induction(values, p, discount, early_exercise).copy()
+	return {
+		'kinds': kinds,
+		'strikes': strikes,
+		'prices': prices,
+		'bs_prices': payoff_black_scholes(kinds, strikes, S0, T, r, sigma)
+	}
+
+def strike_ladder(S0, T, r, sigma, steps, strikes, kinds=("call", "put"), exercise="european"):
+	# Every kind at every strike in one pass, results are keyed by kind with one entry per strike
+	strikes = np.asarray(strikes, dtype=float)
+	results = price_payoffs(S0, T, r, sigma, steps, [(kind, strike) for kind in kinds for strike in strikes], exercise)
+	shape = (len(kinds), len(strikes))
+	prices = results['prices'].reshape(shape)
+	bs_prices = results['bs_prices'].reshape(shape)
+	return {
+		'strikes': strikes,
+		'prices': {kind: prices[i] for i, kind in enumerate(kinds)},
+		'bs_prices': {kind: bs_prices[i] for i, kind in enumerate(kinds)}
+	}
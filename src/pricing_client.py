@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import numpy as np
+from pricing_server import DEFAULT_HOST, DEFAULT_PORT
+
+class PricingClient:
+	# One keep-alive connection to the pricing server, requests on it are sent one after the other
+	def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+		self.host = host
+		self.port = port
+		self.reader = None
+		self.writer = None
+
+	async def __aenter__(self):
+		await self.connect()
+		return self
+
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		await self.close()
+
+	async def connect(self):
+		self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+	async def close(self):
+		if self.writer is not None:
+			self.writer.close()
+			await self.writer.wait_closed()
+			self.writer = None
+
+	async def request(self, method, path, payload=None):
+		body = json.dumps(payload).encode() if payload is not None else b""
+		head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+		self.writer.write(head.encode("latin-1") + body)
+		await self.writer.drain()
+
+		status = int((await self.reader.readline()).split()[1])
+		headers = {}
+		while True:
+			line = await self.reader.readline()
+			if line in (b"\r\n", b"\n", b""):
+				break
+			name, _, value = line.decode("latin-1").partition(":")
+			headers[name.strip().lower()] = value.strip()
+		response = json.loads(await self.reader.readexactly(int(headers.get("content-length", 0))))
+		if headers.get("connection", "").lower() == "close":
+			await self.close()
+			await self.connect()
+		return status, response
+
+	async def price(self, **contract):
+		return await self.request("POST", "/price", contract)
+
+	async def price_many(self, contracts):
+		return await self.request("POST", "/price", {'contracts': contracts})
+
+	async def metrics(self):
+		return (await self.request("GET", "/metrics"))[1]
+
+def random_contracts(count, seed=0):
+	generator = random.Random(seed)
+	return [
+		{
+			'S0': round(generator.uniform(80, 120), 2),
+			'K': round(generator.uniform(80, 120), 2),
+			'T': round(generator.uniform(0.1, 2.0), 3),
+			'r': round(generator.uniform(0.0, 0.08), 4),
+			'sigma': round(generator.uniform(0.1, 0.5), 4),
+			'option_type': generator.choice(("call", "put")),
+			'steps': 200
+		}
+		for _ in range(count)
+	]
+
+async def load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, requests=2000, concurrency=64, distinct=500, seed=0):
+	# Each of the concurrent clients keeps its own connection and sends single-contract requests drawn from a pool of
+	# distinct contracts, so repeated draws exercise the server cache
+	contracts = random_contracts(distinct, seed)
+	generator = random.Random(seed + 1)
+	remaining = [requests]
+	latencies = []
+	statuses = {}
+
+	async def run_client():
+		async with PricingClient(host, port) as client:
+			while remaining[0] > 0:
+				remaining[0] -= 1
+				start = time.perf_counter()
+				status, _ = await client.price(**generator.choice(contracts))
+				latencies.append(time.perf_counter() - start)
+				statuses[status] = statuses.get(status, 0) + 1
+
+	start = time.perf_counter()
+	await asyncio.gather(*(run_client() for _ in range(concurrency)))
+	seconds = time.perf_counter() - start
+
+	async with PricingClient(host, port) as client:
+		server_metrics = await client.metrics()
+
+	latencies = np.array(latencies) * 1000
+	return {
+		'requests': requests,
+		'concurrency': concurrency,
+		'seconds': seconds,
+		'requests_per_second': requests / seconds if seconds > 0 else 0.0,
+		'statuses': statuses,
+		'latency_p50_ms': float(np.percentile(latencies, 50)),
+		'latency_p95_ms': float(np.percentile(latencies, 95)),
+		'latency_p99_ms': float(np.percentile(latencies, 99)),
+		'server': server_metrics
+	}
+
+async def price_command(host, port, contract):
+	async with PricingClient(host, port) as client:
+		return await client.price(**contract)
+
+async def metrics_command(host, port):
+	async with PricingClient(host, port) as client:
+		return await client.metrics()
+
+def main():
+	parser = argparse.ArgumentParser(description="Client and load generator for the local pricing server")
+	parser.add_argument("--host", default=DEFAULT_HOST)
+	parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	price_parser = subparsers.add_parser("price", help="price one contract given as JSON")
+	price_parser.add_argument("contract", help='e.g. {"S0": 100, "K": 105, "T": 1, "r": 0.05, "sigma": 0.2, "option_type": "call"}')
+
+	subparsers.add_parser("metrics", help="print the server metrics")
+
+	load_parser = subparsers.add_parser("load", help="send concurrent requests and report throughput and latency")
+	load_parser.add_argument("--requests", type=int, default=2000)
+	load_parser.add_argument("--concurrency", type=int, default=64)
+	load_parser.add_argument("--distinct", type=int, default=500, help="size of the contract pool the requests are drawn from")
+	load_parser.add_argument("--seed", type=int, default=0)
+
+	args = parser.parse_args()
+	try:
+		if args.command == "price":
+			status, response = asyncio.run(price_command(args.host, args.port, json.loads(args.contract)))
+			print(json.dumps(response, indent=2))
+			return 0 if status == 200 else 1
+		if args.command == "metrics":
+			print(json.dumps(asyncio.run(metrics_command(args.host, args.port)), indent=2))
+			return 0
+		print(json.dumps(asyncio.run(load_test(args.host, args.port, args.requests, args.concurrency, args.distinct, args.seed)), indent=2))
+		return 0
+	except OSError as error:
+		print(f"error: cannot reach the pricing server at {args.host}:{args.port} ({error})", file=sys.stderr)
+		return 1
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch_pricing import price_batch
+from binomial_tree import SCHEMES, BinomialTree
+from tree_cache import tree_key
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+BATCH_WINDOW = 0.005
+MAX_BATCH_SIZE = 4096
+MAX_PENDING = 20000
+MAX_STEPS = 100000
+# European prices are an O(N) terminal sum, American ones still run the O(N^2) induction
+MAX_AMERICAN_STEPS = 5000
+MAX_BODY_BYTES = 8 * 2**20
+CACHE_ENTRIES = 100000
+LATENCY_SAMPLES = 10000
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ServerOverloaded(Exception):
+	pass
+
+def contract_params(payload):
+	if not isinstance(payload, dict):
+		raise ValueError("a contract must be a JSON object")
+	missing = [name for name in ("S0", "K", "T", "r", "sigma", "option_type") if name not in payload]
+	if missing:
+		raise ValueError(f"missing fields: {', '.join(missing)}")
+
+	params = {}
+	for name in ("S0", "K", "T", "r", "sigma"):
+		value = payload[name]
+		if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+			raise ValueError(f"{name} must be a finite number")
+		params[name] = float(value)
+	for name in ("S0", "K", "T", "sigma"):
+		if params[name] <= 0:
+			raise ValueError(f"{name} must be positive")
+
+	params['option_type'] = payload['option_type']
+	params['steps'] = payload.get('steps', 200)
+	params['exercise'] = payload.get('exercise', "european")
+	params['scheme'] = payload.get('scheme', "crr")
+	if params['option_type'] not in ("call", "put"):
+		raise ValueError("option_type must be call or put")
+	if isinstance(params['steps'], bool) or not isinstance(params['steps'], int) or not 1 <= params['steps'] <= MAX_STEPS:
+		raise ValueError(f"steps must be an integer between 1 and {MAX_STEPS}")
+	if params['exercise'] not in ("european", "american"):
+		raise ValueError("exercise must be european or american")
+	if params['exercise'] == "american" and params['steps'] > MAX_AMERICAN_STEPS:
+		raise ValueError(f"steps must be at most {MAX_AMERICAN_STEPS} for american exercise")
+	if params['scheme'] not in SCHEMES:
+		raise ValueError(f"scheme must be one of {', '.join(SCHEMES)}")
+	return params
+
+def price_contract(params):
+	# Errors are returned rather than raised, so one bad contract only fails its own request
+	try:
+		if params['scheme'] == "crr":
+			prices, bs_prices = price_batch(*([params[name]] for name in ("S0", "K", "T", "r", "sigma", "option_type")), params['steps'], exercise=params['exercise'])
+			return float(prices[0]), float(bs_prices[0])
+		tree = BinomialTree(**params, price_only=True)
+		return tree.option_price, tree.black_scholes_price()
+	except Exception as error:
+		return error
+
+def price_contracts(contracts):
+	# Runs in a worker process: CRR contracts sharing a lattice size and exercise style go through one vectorized
+	# batch, the smoothed and extrapolated schemes are priced tree by tree. Each result is a (price, bs_price) pair or
+	# the exception that contract raised
+	results = [None] * len(contracts)
+	groups = {}
+	for index, params in enumerate(contracts):
+		groups.setdefault((params['steps'], params['exercise'], params['scheme']), []).append(index)
+
+	for (steps, exercise, scheme), indices in groups.items():
+		if scheme == "crr":
+			columns = [[contracts[index][name] for index in indices] for name in ("S0", "K", "T", "r", "sigma", "option_type")]
+			try:
+				prices, bs_prices = price_batch(*columns, steps, exercise=exercise)
+			except Exception:
+				# The vectorized batch fails as a whole, pricing its contracts one by one isolates the bad ones
+				for index in indices:
+					results[index] = price_contract(contracts[index])
+				continue
+			for index, price, bs_price in zip(indices, prices.tolist(), bs_prices.tolist()):
+				results[index] = (price, bs_price)
+		else:
+			for index in indices:
+				results[index] = price_contract(contracts[index])
+	return results
+
+class PricingServer:
+	def __init__(self, workers=None, batch_window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE, max_pending=MAX_PENDING, cache_entries=CACHE_ENTRIES):
+		self.workers = workers or os.cpu_count() or 1
+		self.batch_window = batch_window
+		self.max_batch_size = max_batch_size
+		self.max_pending = max_pending
+		self.cache_entries = cache_entries
+		self.cache = OrderedDict()
+		self.inflight = {}
+		self.queue = None
+		self.slots = None
+		self.executor = None
+		self.server = None
+		self.batcher = None
+		self.started = time.monotonic()
+		self.latencies = deque(maxlen=LATENCY_SAMPLES)
+		self.counters = {
+			'requests': 0,
+			'contracts': 0,
+			'cache_hits': 0,
+			'coalesced': 0,
+			'rejected': 0,
+			'errors': 0,
+			'batches': 0,
+			'batched_contracts': 0
+		}
+
+	async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+		self.queue = asyncio.Queue(maxsize=self.max_pending)
+		# One batch per worker at a time, further contracts wait in the queue and are refused once it is full
+		self.slots = asyncio.Semaphore(self.workers)
+		# Forked workers would inherit the listening socket and keep accepting connections if the server died, so they are spawned
+		self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+		self.batcher = asyncio.create_task(self.batch_loop())
+		self.server = await asyncio.start_server(self.handle_connection, host, port)
+		self.started = time.monotonic()
+		return self.server.sockets[0].getsockname()[:2]
+
+	async def close(self):
+		if self.server is not None:
+			self.server.close()
+			await self.server.wait_closed()
+		if self.batcher is not None:
+			self.batcher.cancel()
+		if self.executor is not None:
+			self.executor.shutdown(wait=False, cancel_futures=True)
+
+	async def price(self, params):
+		# Cached results answer at once, a contract already queued or running is shared instead of priced twice
+		key = tree_key(**params, price_only=True)
+		self.counters['contracts'] += 1
+		if key in self.cache:
+			self.cache.move_to_end(key)
+			self.counters['cache_hits'] += 1
+			price, bs_price = self.cache[key]
+			return {'price': price, 'bs_price': bs_price, 'cached': True}
+
+		future = self.inflight.get(key)
+		if future is not None:
+			self.counters['coalesced'] += 1
+		else:
+			if self.queue.full():
+				self.counters['rejected'] += 1
+				raise ServerOverloaded()
+			future = asyncio.get_running_loop().create_future()
+			self.inflight[key] = future
+			self.queue.put_nowait((key, params, future))
+
+		price, bs_price = await asyncio.shield(future)
+		return {'price': price, 'bs_price': bs_price, 'cached': False}
+
+	async def batch_loop(self):
+		while True:
+			batch = [await self.queue.get()]
+			# Waiting a few milliseconds lets concurrent requests land in the same vectorized batch
+			if self.queue.qsize() < self.max_batch_size - 1:
+				await asyncio.sleep(self.batch_window)
+			while len(batch) < self.max_batch_size and not self.queue.empty():
+				batch.append(self.queue.get_nowait())
+
+			await self.slots.acquire()
+			asyncio.create_task(self.run_batch(batch))
+
+	async def run_batch(self, batch):
+		try:
+			self.counters['batches'] += 1
+			self.counters['batched_contracts'] += len(batch)
+			loop = asyncio.get_running_loop()
+			try:
+				results = await loop.run_in_executor(self.executor, price_contracts, [params for _, params, _ in batch])
+			except Exception as error:
+				self.counters['errors'] += len(batch)
+				for key, _, future in batch:
+					self.inflight.pop(key, None)
+					if not future.done():
+						future.set_exception(error)
+				return
+
+			for (key, _, future), result in zip(batch, results):
+				self.inflight.pop(key, None)
+				if isinstance(result, Exception):
+					self.counters['errors'] += 1
+					if not future.done():
+						future.set_exception(result)
+					continue
+				self.cache_result(key, result)
+				if not future.done():
+					future.set_result(result)
+		finally:
+			self.slots.release()
+
+	def cache_result(self, key, result):
+		self.cache[key] = result
+		self.cache.move_to_end(key)
+		while len(self.cache) > self.cache_entries:
+			self.cache.popitem(last=False)
+
+	def metrics(self):
+		uptime = time.monotonic() - self.started
+		latencies = np.array(self.latencies) * 1000
+		metrics = dict(self.counters)
+		metrics.update({
+			'uptime_seconds': uptime,
+			'contracts_per_second': self.counters['contracts'] / uptime if uptime > 0 else 0.0,
+			'mean_batch_size': self.counters['batched_contracts'] / self.counters['batches'] if self.counters['batches'] else 0.0,
+			'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+			'cache_entries': len(self.cache),
+			'workers': self.workers
+		})
+		for name, q in (('p50', 50), ('p95', 95), ('p99', 99)):
+			metrics[f'latency_{name}_ms'] = float(np.percentile(latencies, q)) if latencies.size else None
+		return metrics
+
+	async def route(self, method, path, body):
+		if path == "/health":
+			return 200, {'status': "ok"}
+		if path == "/metrics":
+			return 200, self.metrics()
+		if path != "/price":
+			return 404, {'error': f"unknown path {path}"}
+		if method != "POST":
+			return 405, {'error': "POST a contract or {\"contracts\": [...]} to /price"}
+
+		start = time.perf_counter()
+		self.counters['requests'] += 1
+		try:
+			payload = json.loads(body or b"null")
+			if isinstance(payload, dict) and 'contracts' in payload:
+				if not isinstance(payload['contracts'], list):
+					raise ValueError("contracts must be a list")
+				contracts = [contract_params(contract) for contract in payload['contracts']]
+				# A list is admitted as a whole or not at all, so a client never gets half of its batch
+				if self.queue.qsize() + len(contracts) > self.max_pending:
+					self.counters['rejected'] += len(contracts)
+					raise ServerOverloaded()
+				response = {'results': await asyncio.gather(*(self.price(params) for params in contracts))}
+			else:
+				response = await self.price(contract_params(payload))
+		except ValueError as error:
+			return 400, {'error': str(error)}
+		except ServerOverloaded:
+			return 503, {'error': "server overloaded, retry later"}
+		except Exception as error:
+			return 500, {'error': str(error)}
+		self.latencies.append(time.perf_counter() - start)
+		return 200, response
+
+	async def handle_connection(self, reader, writer):
+		# Minimal HTTP/1.1 with keep-alive, enough for JSON requests from local clients
+		try:
+			while True:
+				request_line = await reader.readline()
+				if not request_line:
+					break
+				method, path, version = request_line.decode("latin-1").split()
+				headers = {}
+				while True:
+					line = await reader.readline()
+					if line in (b"\r\n", b"\n", b""):
+						break
+					name, _, value = line.decode("latin-1").partition(":")
+					headers[name.strip().lower()] = value.strip()
+
+				length = int(headers.get("content-length", 0))
+				if length > MAX_BODY_BYTES:
+					await self.respond(writer, 413, {'error': "request body too large"}, False)
+					break
+				body = await reader.readexactly(length) if length else b""
+
+				status, payload = await self.route(method, path.split("?")[0], body)
+				keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+				await self.respond(writer, status, payload, keep_alive)
+				if not keep_alive:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+			pass
+		finally:
+			writer.close()
+
+	@staticmethod
+	async def respond(writer, status, payload, keep_alive):
+		body = json.dumps(payload).encode()
+		headers = [
+			f"HTTP/1.1 {status} {REASONS[status]}",
+			"Content-Type: application/json",
+			f"Content-Length: {len(body)}",
+			f"Connection: {'keep-alive' if keep_alive else 'close'}"
+		]
+		if status == 503:
+			headers.append("Retry-After: 1")
+		writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+		await writer.drain()
+
+async def serve(host, port, **options):
+	server = PricingServer(**options)
+	host, port = await server.start(host, port)
+	print(f"Pricing server listening on http://{host}:{port} ({server.workers} workers)")
+	loop = asyncio.get_running_loop()
+	if hasattr(signal, "SIGTERM") and sys.platform != "win32":
+		loop.add_signal_handler(signal.SIGTERM, server.server.close)
+	try:
+		await server.server.serve_forever()
+	except asyncio.CancelledError:
+		# SIGTERM closes the listening socket, which ends serve_forever
+		pass
+	finally:
+		await server.close()
+
+def main():
+	parser = argparse.ArgumentParser(description="Local HTTP/JSON pricing service with request micro-batching")
+	parser.add_argument("--host", default=DEFAULT_HOST)
+	parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+	parser.add_argument("--workers", type=int, default=None)
+	parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW * 1000, help="milliseconds to collect requests into one batch")
+	parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+	parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="queued contracts before requests are refused with 503")
+	parser.add_argument("--cache-entries", type=int, default=CACHE_ENTRIES)
+	args = parser.parse_args()
+
+	try:
+		asyncio.run(serve(args.host, args.port, workers=args.workers, batch_window=args.batch_window / 1000, max_batch_size=args.max_batch_size, max_pending=args.max_pending, cache_entries=args.cache_entries))
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_BUDGET = 0.5
+WINDOW_BUDGET = 1.0
+HEAVY_MODULES = ("scipy", "matplotlib")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import binomial_tree
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+
+WINDOW_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print(json.dumps({'seconds': None, 'modules': []}))
+    sys.exit()
+from config_window import ConfigWindow
+ConfigWindow(root)
+root.update()
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+root.destroy()
+"""
+
+def run_probe(code):
+	# Each probe runs in a fresh interpreter so nothing is already imported
+	output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+	return json.loads(output.stdout.strip().splitlines()[-1])
+
+def measure(code, repeat):
+	runs = [run_probe(code) for _ in range(repeat)]
+	if runs[0]['seconds'] is None:
+		return None, []
+	heavy = sorted({module.split(".")[0] for module in runs[0]['modules'] if module.split(".")[0] in HEAVY_MODULES})
+	return statistics.median(run['seconds'] for run in runs), heavy
+
+def main():
+	parser = argparse.ArgumentParser(description="Check import time and time to first window against a budget")
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+	parser.add_argument("--window-budget", type=float, default=WINDOW_BUDGET)
+	args = parser.parse_args()
+
+	failures = []
+	for name, code, budget in (("import binomial_tree", IMPORT_PROBE, args.import_budget), ("first window", WINDOW_PROBE, args.window_budget)):
+		seconds, heavy = measure(code, args.repeat)
+		if seconds is None:
+			print(f"{name}: skipped, no display available")
+			continue
+
+		print(f"{name}: {seconds * 1000:.1f} ms (budget {budget * 1000:.0f} ms)")
+		if seconds > budget:
+			failures.append(f"{name} took {seconds * 1000:.1f} ms")
+		if heavy:
+			failures.append(f"{name} loaded {', '.join(heavy)}")
+
+	for failure in failures:
+		print(f"FAIL: {failure}")
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
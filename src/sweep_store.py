@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "binomial-model", "sweeps")
+RECORD_DTYPE = np.dtype([('steps', np.int64), ('price', np.float64)])
+EXPORT_BLOCK = 65536
+
+def params_hash(tree_params):
+	# Numbers are rounded like tree_key, so slider noise does not split one contract over several files
+	canonical = {name: round(float(value), 10) if isinstance(value, (int, float)) and not isinstance(value, bool) else value for name, value in tree_params.items()}
+	return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()[:20]
+
+class SweepStore:
+	# One structured .npy per contract holding (steps, price) sorted by steps, read through a memory map
+	# Overlapping step ranges of the same contract share rows, so the file is keyed by the contract alone
+	def __init__(self, root=None):
+		self.root = root or os.environ.get("BINOMIAL_SWEEP_STORE", DEFAULT_ROOT)
+
+	def path(self, tree_params):
+		return os.path.join(self.root, params_hash(tree_params) + ".npy")
+
+	def records(self, tree_params):
+		try:
+			return np.load(self.path(tree_params), mmap_mode="r")
+		except FileNotFoundError:
+			return None
+
+	def load(self, tree_params, steps_range=None):
+		records = self.records(tree_params)
+		if records is None or len(records) == 0:
+			return {}
+		if steps_range is not None:
+			records = records[np.isin(records['steps'], np.asarray(list(steps_range), dtype=np.int64))]
+		return dict(zip(records['steps'].tolist(), records['price'].tolist()))
+
+	def save(self, tree_params, prices):
+		# Merged with what is on disk and written to a temporary file first, so readers never see a half written store
+		if not prices:
+			return
+		merged = self.load(tree_params)
+		merged.update(prices)
+		records = np.empty(len(merged), dtype=RECORD_DTYPE)
+		records['steps'] = sorted(merged)
+		records['price'] = [merged[steps] for steps in records['steps'].tolist()]
+
+		os.makedirs(self.root, exist_ok=True)
+		descriptor, temporary = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+		try:
+			with os.fdopen(descriptor, "wb") as file:
+				np.save(file, records)
+			os.replace(temporary, self.path(tree_params))
+		except BaseException:
+			os.unlink(temporary)
+			raise
+
+		with open(os.path.join(self.root, params_hash(tree_params) + ".json"), "w") as file:
+			json.dump(tree_params, file)
+
+	def iter_rows(self, tree_params, steps_range=None, block=EXPORT_BLOCK):
+		# Yields (steps, price) in step order, reading the memory map one block at a time
+		records = self.records(tree_params)
+		if records is None:
+			return
+		wanted = np.asarray(list(steps_range), dtype=np.int64) if steps_range is not None else None
+		for start in range(0, len(records), block):
+			chunk = records[start:start + block]
+			if wanted is not None:
+				chunk = chunk[np.isin(chunk['steps'], wanted)]
+			yield from zip(chunk['steps'].tolist(), chunk['price'].tolist())
+
+	def clear(self, tree_params):
+		for suffix in (".npy", ".json"):
+			try:
+				os.unlink(os.path.join(self.root, params_hash(tree_params) + suffix))
+			except FileNotFoundError:
+				pass
+
+shared_store = SweepStore()
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from binomial_tree import BinomialTree, lattice_nodes
+
+PRICE_ONLY_BYTES = 1024
+
+def tree_key(S0, K, T, r, sigma, steps, option_type, max_steps=30, price_only=False, exercise="european", scheme="crr", dtype=np.float64, prune_sigmas=None):
+	# Slider values go through float rounding, so near-identical inputs are folded onto the same key; max_steps only
+	# bounds the GUI slider, so it is left out and sweep and visualizer trees of one contract are shared
+	return (
+		round(float(S0), 10),
+		round(float(K), 10),
+		round(float(T), 10),
+		round(float(r), 10),
+		round(float(sigma), 10),
+		int(steps),
+		option_type,
+		exercise,
+		scheme,
+		np.dtype(dtype).name,
+		None if prune_sigmas is None else round(float(prune_sigmas), 10),
+		bool(price_only)
+	)
+
+def tree_params(tree):
+	return {
+		'S0': tree.S0,
+		'K': tree.K,
+		'T': tree.T,
+		'r': tree.r,
+		'sigma': tree.sigma,
+		'steps': tree.steps,
+		'option_type': tree.option_type,
+		'max_steps': tree.max_steps,
+		'price_only': tree.price_only,
+		'exercise': tree.exercise,
+		'scheme': tree.scheme,
+		'dtype': tree.dtype,
+		'prune_sigmas': tree.prune_sigmas
+	}
+
+def tree_bytes(tree):
+	if tree.price_only:
+		return PRICE_ONLY_BYTES
+	# Stock prices, option values and profits, each one flat array of the tree's storage type
+	return 3 * lattice_nodes(tree.steps) * tree.dtype.itemsize
+
+class TreeCache:
+	def __init__(self, max_entries=128, max_bytes=256 * 2**20):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.trees = OrderedDict()
+		self.bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def get(self, **params):
+		tree = self.lookup(**params)
+		if tree is None:
+			tree = BinomialTree(**params)
+			self.put(tree)
+		return tree
+
+	def derive(self, tree, **params):
+		# Misses are derived from a related tree, so only the stages the differing parameters feed are recomputed
+		derived = self.lookup(**params)
+		if derived is None:
+			derived = tree.derive(**params).refresh()
+			self.put(derived)
+		return derived
+
+	def lookup(self, **params):
+		key = tree_key(**params)
+		keys = [key]
+		if key[-1]:
+			# A full lattice also answers a price-only request for the same contract
+			keys.append(key[:-1] + (False,))
+
+		with self.lock:
+			for candidate in keys:
+				if candidate in self.trees:
+					self.trees.move_to_end(candidate)
+					self.hits += 1
+					return self.trees[candidate]
+			self.misses += 1
+			return None
+
+	def put(self, tree):
+		key = tree_key(**tree_params(tree))
+		size = tree_bytes(tree)
+		if size > self.max_bytes:
+			return
+
+		tree.shared = True
+		with self.lock:
+			if key in self.trees:
+				self.bytes -= tree_bytes(self.trees.pop(key))
+			self.trees[key] = tree
+			self.bytes += size
+			while len(self.trees) > self.max_entries or self.bytes > self.max_bytes:
+				_, evicted = self.trees.popitem(last=False)
+				self.bytes -= tree_bytes(evicted)
+
+	def clear(self):
+		with self.lock:
+			self.trees.clear()
+			self.bytes = 0
+
+	def stats(self):
+		with self.lock:
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'entries': len(self.trees),
+				'bytes': self.bytes
+			}
+
+shared_cache = TreeCache()
@@ -0,0 +1,61 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class TreeStats:
+	ROW_HEADER = ['phase', 'calls', 'seconds', 'nodes', 'allocated_bytes', 'peak_bytes']
+
+	def __init__(self, track_memory=False):
+		# tracemalloc hooks every allocation and slows the list lattices down several times, so memory tracking is a separate opt-in
+		self.track_memory = track_memory
+		self.phases = {}
+
+	@contextmanager
+	def phase(self, name, nodes):
+		started_tracing = False
+		if self.track_memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				started_tracing = True
+			baseline, _ = tracemalloc.get_traced_memory()
+			tracemalloc.reset_peak()
+
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			seconds = time.perf_counter() - start
+			allocated = peak = 0
+			if self.track_memory:
+				current, traced_peak = tracemalloc.get_traced_memory()
+				allocated = current - baseline
+				peak = traced_peak - baseline
+				if started_tracing:
+					tracemalloc.stop()
+			self.record(name, 1, seconds, nodes, allocated, peak)
+
+	def record(self, name, calls, seconds, nodes, allocated_bytes, peak_bytes):
+		phase = self.phases.setdefault(name, {'calls': 0, 'seconds': 0.0, 'nodes': 0, 'allocated_bytes': 0, 'peak_bytes': 0})
+		phase['calls'] += calls
+		phase['seconds'] += seconds
+		phase['nodes'] += nodes
+		phase['allocated_bytes'] += allocated_bytes
+		phase['peak_bytes'] = max(phase['peak_bytes'], peak_bytes)
+
+	def merge(self, other):
+		for name, phase in other.phases.items():
+			self.record(name, phase['calls'], phase['seconds'], phase['nodes'], phase['allocated_bytes'], phase['peak_bytes'])
+		return self
+
+	def seconds(self):
+		return {name: phase['seconds'] for name, phase in self.phases.items()}
+
+	def total_seconds(self):
+		return sum(phase['seconds'] for phase in self.phases.values())
+
+	def as_dict(self):
+		return {'track_memory': self.track_memory, 'phases': {name: dict(phase) for name, phase in self.phases.items()}}
+
+	def rows(self):
+		# One row per phase, in the order the phases first ran, for CSV export
+		return [[name, phase['calls'], phase['seconds'], phase['nodes'], phase['allocated_bytes'], phase['peak_bytes']] for name, phase in self.phases.items()]
@@ -1,9 +1,24 @@
+import math
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk
-from binomial_tree import BinomialTree
+import numpy as np
+from binomial_tree import SCHEMES, BinomialTree
+from lattice_raster import flatten_lattice, gradient_colors, ppm_data, raster_nodes, render_pixels, surface_rgb, value_colors
 from tooltip import Tooltip
+from tree_cache import shared_cache
 
 class TreeVisualizer:
+	RASTER_NODE_THRESHOLD = 2000
+	LABEL_MIN_SPACING = 36
+	SURFACE_CELL = 4
+	SURFACE_MARGINS = (70, 30, 20, 45)
+	POLL_INTERVAL = 30
+	# Flat lattices built on the worker thread keep the Tk thread free, a 5000 step tree takes about 0.5 s and 300 MB
+	MAX_STEPS = 5000
+	REBUILD_DELAY = 0.15
+
 	def __init__(self, root, tree: BinomialTree):
 		self.canvas = None
 		self.root = root
@@ -15,11 +30,29 @@ class TreeVisualizer:
 		self.is_panning = False
 		self.last_pan_x = 0
 		self.last_pan_y = 0
+		self.drawn_region = None
+		self.base_node_radius = 0
+		self.raster_image = None
+		self.raster_layer = None
+		self.surface_layer = None
+
+		# Parameter changes are computed on a worker thread, only the newest generation is ever built or applied
+		self.generation = 0
+		self.tree_generation = 0
+		self.latest_request = None
+		self.requests = threading.Condition()
+		self.results = queue.Queue()
+		self.worker = None
+		self.polling = False
 
 		self.option_type_var = tk.StringVar(value=self.tree.option_type)
+		self.exercise_var = tk.StringVar(value=self.tree.exercise)
+		self.scheme_var = tk.StringVar(value=self.tree.scheme)
 		self.show_stock_var = tk.BooleanVar(value=False)
 		self.show_most_likely_path_var = tk.BooleanVar(value=False)
 		self.show_profits_var = tk.BooleanVar(value=False)
+		self.show_exercise_boundary_var = tk.BooleanVar(value=False)
+		self.show_surface_var = tk.BooleanVar(value=False)
 
 		self.setup_ui()
 		self.update_price_display()
@@ -90,6 +123,11 @@ class TreeVisualizer:
 
 		ttk.Radiobutton(option_frame, text="Call option", variable=self.option_type_var, value="call", command=self.on_param_change).grid(row=0, column=0, sticky="w")
 		ttk.Radiobutton(option_frame, text="Put option", variable=self.option_type_var, value="put", command=self.on_param_change).grid(row=1, column=0, sticky="w")
+		ttk.Radiobutton(option_frame, text="European", variable=self.exercise_var, value="european", command=self.on_param_change).grid(row=2, column=0, sticky="w", pady=(10, 0))
+		ttk.Radiobutton(option_frame, text="American", variable=self.exercise_var, value="american", command=self.on_param_change).grid(row=3, column=0, sticky="w")
+		scheme_combo = ttk.Combobox(option_frame, textvariable=self.scheme_var, values=list(SCHEMES), state="readonly", width=10)
+		scheme_combo.grid(row=4, column=0, sticky="w", pady=(10, 0))
+		scheme_combo.bind("<<ComboboxSelected>>", self.on_param_change)
 
 		display_frame = ttk.LabelFrame(control_frame, text="Display", padding=10)
 		display_frame.grid(row=0, column=4, rowspan=2, sticky="nsew", padx=10, pady=5)
@@ -97,7 +135,9 @@ class TreeVisualizer:
 		ttk.Checkbutton(display_frame, text="Show stock prices", variable=self.show_stock_var, command=self.draw_tree).grid(row=0, column=0, sticky="w")
 		ttk.Checkbutton(display_frame, text="Show most likely path", variable=self.show_most_likely_path_var, command=self.draw_tree).grid(row=1, column=0, sticky="w")
 		ttk.Checkbutton(display_frame, text="Show profits", variable=self.show_profits_var, command=self.draw_tree).grid(row=2, column=0, sticky="w")
-		ttk.Button(display_frame, text="Plot convergence", command=self.open_plot_window).grid(row=3, column=0, sticky="w")
+		ttk.Checkbutton(display_frame, text="Show exercise boundary", variable=self.show_exercise_boundary_var, command=self.draw_tree).grid(row=3, column=0, sticky="w")
+		ttk.Checkbutton(display_frame, text="Show value surface", variable=self.show_surface_var, command=self.draw_tree).grid(row=4, column=0, sticky="w")
+		ttk.Button(display_frame, text="Plot convergence", command=self.open_plot_window).grid(row=5, column=0, sticky="w")
 
 		self.price_label = ttk.Label(control_frame, text="Option price: ", font=("Arial", 12, "bold"))
 		self.price_label.grid(row=2, column=0, columnspan=3, pady=5, sticky="w")
@@ -139,44 +179,44 @@ class TreeVisualizer:
 		self.update_zoom_label()
 
 	def return_to_menu(self):
+		self.stop_worker()
 		if self.root.master:
 			self.root.master.deiconify()
 		self.root.destroy()
 
 	def zoom_out(self):
-		old_zoom = self.zoom_factor
-		self.zoom_factor = max(0.1, self.zoom_factor / 1.2)
-		self._apply_zoom_center(old_zoom)
+		self._apply_zoom(max(0.1, self.zoom_factor / 1.2))
 
 	def zoom_in(self):
-		old_zoom = self.zoom_factor
-		self.zoom_factor = min(5.0, self.zoom_factor * 1.2)
-		self._apply_zoom_center(old_zoom)
+		self._apply_zoom(min(self.max_zoom(), self.zoom_factor * 1.2))
+
+	def max_zoom(self):
+		# Heatmap nodes start out a few pixels wide, so they may be zoomed until their labels show
+		if not self.tree or not self.use_raster():
+			return 5.0
+		spacing = min(self.canvas.winfo_width(), self.canvas.winfo_height()) / (self.tree.steps + 2)
+		return max(5.0, 2 * self.LABEL_MIN_SPACING / max(spacing, 1e-9))
+
+	def use_raster(self):
+		return (self.tree.steps + 1) * (self.tree.steps + 2) // 2 > self.RASTER_NODE_THRESHOLD
 
 	def zoom_reset(self):
-		self.zoom_factor = 1.0
-		self.pan_offset_x = 0
-		self.pan_offset_y = 0
-		self.draw_tree()
+		self.set_view(1.0, 0, 0)
 		self.update_zoom_label()
 
 	def zoom_center(self):
-		self.pan_offset_x = 0
-		self.pan_offset_y = 0
-		self.draw_tree()
+		self.set_view(self.zoom_factor, 0, 0)
 
-	def _apply_zoom_center(self, old_zoom):
-		if old_zoom != self.zoom_factor:
-			self.draw_tree()
+	def _apply_zoom(self, zoom_factor):
+		if zoom_factor != self.zoom_factor:
+			self.set_view(zoom_factor, self.pan_offset_x, self.pan_offset_y)
 			self.update_zoom_label()
 
 	def update_zoom_label(self):
 		self.zoom_label.config(text=f"{int(self.zoom_factor * 100)}%")
 
 	def pan_key(self, dx, dy):
-		self.pan_offset_x += dx
-		self.pan_offset_y += dy
-		self.draw_tree()
+		self.set_view(self.zoom_factor, self.pan_offset_x + dx, self.pan_offset_y + dy)
 
 	def on_pan_start(self, event):
 		self.is_panning = True
@@ -188,20 +228,63 @@ class TreeVisualizer:
 		if self.is_panning:
 			dx = event.x - self.last_pan_x
 			dy = event.y - self.last_pan_y
-			self.pan_offset_x += dx
-			self.pan_offset_y += dy
 			self.last_pan_x = event.x
 			self.last_pan_y = event.y
-			self.draw_tree()
+			self.set_view(self.zoom_factor, self.pan_offset_x + dx, self.pan_offset_y + dy)
 
 	def on_pan_end(self, event):
 		self.is_panning = False
 		self.canvas.config(cursor="fleur")
 
+	def set_view(self, zoom_factor, pan_offset_x, pan_offset_y):
+		# Screen coordinates are base * zoom + pan, so existing items are scaled around the old pan origin and then moved
+		ratio = zoom_factor / self.zoom_factor
+		if ratio != 1:
+			self.canvas.scale("tree", self.pan_offset_x, self.pan_offset_y, ratio, ratio)
+		self.canvas.move("tree", pan_offset_x - self.pan_offset_x, pan_offset_y - self.pan_offset_y)
+
+		self.zoom_factor = zoom_factor
+		self.pan_offset_x = pan_offset_x
+		self.pan_offset_y = pan_offset_y
+		if ratio != 1:
+			self.update_label_fonts()
+
+		# Only nodes around the viewport exist on the canvas, leaving that region means rebuilding around the new view
+		if self.drawn_region is None or not self.region_contains(self.drawn_region, self.visible_region()):
+			self.draw_tree()
+
+	def visible_region(self, margin=0.0):
+		width = self.canvas.winfo_width()
+		height = self.canvas.winfo_height()
+		x_min = -self.pan_offset_x / self.zoom_factor
+		y_min = -self.pan_offset_y / self.zoom_factor
+		x_max = (width - self.pan_offset_x) / self.zoom_factor
+		y_max = (height - self.pan_offset_y) / self.zoom_factor
+		pad_x = (x_max - x_min) * margin
+		pad_y = (y_max - y_min) * margin
+		return (x_min - pad_x, y_min - pad_y, x_max + pad_x, y_max + pad_y)
+
+	@staticmethod
+	def region_contains(outer, inner):
+		return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+	def label_fonts(self):
+		node_radius = self.base_node_radius * self.zoom_factor
+		value_font = ("Arial", int(max(9, (node_radius // 3)) * self.zoom_factor))
+		stock_font = ("Arial", int(max(8, (node_radius // 4)) * self.zoom_factor))
+		return value_font, stock_font
+
+	def update_label_fonts(self):
+		value_font, stock_font = self.label_fonts()
+		self.canvas.itemconfigure("value_label", font=value_font)
+		self.canvas.itemconfigure("stock_label", font=stock_font)
+
 	def draw_tree(self):
+		# Full rebuild of the canvas items, pan and zoom only move and scale what is drawn here
 		if not self.canvas:
 			return
 		self.canvas.delete("all")
+		self.drawn_region = None
 
 		self.canvas.update_idletasks()
 		canvas_width = self.canvas.winfo_width()
@@ -213,62 +296,84 @@ class TreeVisualizer:
 		if not self.tree:
 			return
 
+		if self.show_surface_var.get():
+			self.draw_surface(canvas_width, canvas_height)
+			return
+
+		if self.use_raster():
+			self.draw_raster(canvas_width, canvas_height)
+			return
+
 		base_x_spacing = max(80, canvas_width // (self.tree.steps + 2))
 		base_y_spacing = max(60, canvas_height // (self.tree.steps + 2))
+		self.base_node_radius = min(20, base_x_spacing // 4, base_y_spacing // 4)
+
+		node_radius = self.base_node_radius * self.zoom_factor
+		value_font, stock_font = self.label_fonts()
 
-		x_spacing = base_x_spacing * self.zoom_factor
-		y_spacing = base_y_spacing * self.zoom_factor
-		node_radius = min(20, base_x_spacing // 4, base_y_spacing // 4) * self.zoom_factor
+		region = self.visible_region(margin=1.0)
+		x_min, y_min, x_max, y_max = region
 
+		def in_region(base_x, base_y):
+			return x_min <= base_x <= x_max and y_min <= base_y <= y_max
+
+		base_positions = {}
 		node_positions = {}
 
 		for step in range(len(self.tree.option_values)):
-			for node in range(len(self.tree.option_values[step])):
+			# Rows come out of the flat lattices as views, one tolist per row avoids boxing every node through numpy
+			option_row = self.tree.option_values[step].tolist()
+			profit_row = self.tree.profit_values[step].tolist()
+			price_row = self.tree.prices[step].tolist()
+			for node in range(len(option_row)):
 				base_x = (step + 1) * base_x_spacing
 				base_y = canvas_height // 2 + (node - step/2) * base_y_spacing
 
 				x = base_x * self.zoom_factor + self.pan_offset_x
 				y = base_y * self.zoom_factor + self.pan_offset_y
 
-				y = max(node_radius + 5, min(canvas_height - node_radius - 5, y))
-
+				base_positions[(step, node)] = (base_x, base_y)
 				node_positions[(step, node)] = (x, y)
 
-				option_value = self.tree.option_values[step][node]
+				if not in_region(base_x, base_y):
+					continue
+
+				option_value = option_row[node]
 				if self.option_type_var.get() == "call":
 					color = 'lightgreen' if option_value > 0 else 'lightcoral'
 				else:
 					color = 'lightblue' if option_value > 0 else 'lightcoral'
 
 				if self.show_profits_var.get():
-					profit = self.tree.profit_values[step][node]
+					profit = profit_row[node]
 					if profit > 0:
 						color = 'lightgreen' if self.option_type_var.get() == "call" else 'lightblue'
 					else:
 						color = 'lightcoral'
 
-				self.canvas.create_oval(x - node_radius, y - node_radius, x + node_radius, y + node_radius, fill=color, outline='black', width=1)
-				
+				self.canvas.create_oval(x - node_radius, y - node_radius, x + node_radius, y + node_radius, fill=color, outline='black', width=1, tags=("tree", "node"))
+
 				if self.show_profits_var.get():
-					self.canvas.create_text(x, y, text=f"{profit:.2f}", font=("Arial", int(max(9, (node_radius // 3))*self.zoom_factor)), fill='black')
+					self.canvas.create_text(x, y, text=f"{profit:.2f}", font=value_font, fill='black', tags=("tree", "value_label"))
 				else:
-					self.canvas.create_text(x, y, text=f"{option_value:.2f}", font=("Arial", int(max(9, (node_radius // 3))*self.zoom_factor)), fill='black')
+					self.canvas.create_text(x, y, text=f"{option_value:.2f}", font=value_font, fill='black', tags=("tree", "value_label"))
 
 				if self.show_stock_var.get():
-					stock_price = self.tree.prices[step][node]
-					self.canvas.create_text(x, y + node_radius + 12, text=f"{stock_price:.1f}", font=("Arial", int(max(8, (node_radius // 4))*self.zoom_factor)), fill='black')
+					stock_price = price_row[node]
+					self.canvas.create_text(x, y + node_radius + 12, text=f"{stock_price:.1f}", font=stock_font, fill='black', tags=("tree", "stock_label"))
 
 		for step in range(1, len(self.tree.prices)):
 			for node in range(len(self.tree.prices[step])):
 				x, y = node_positions[(step, node)]
+				visible = in_region(*base_positions[(step, node)])
 
-				if node < step:
+				if node < step and (visible or in_region(*base_positions[(step - 1, node)])):
 					parent_x, parent_y = node_positions[(step - 1, node)]
-					self.canvas.create_line(parent_x, parent_y, x, y, fill="blue", width=1)
+					self.canvas.create_line(parent_x, parent_y, x, y, fill="blue", width=1, tags=("tree", "edge"))
 
-				if node > 0:
+				if node > 0 and (visible or in_region(*base_positions[(step - 1, node - 1)])):
 					parent_x, parent_y = node_positions[(step - 1, node - 1)]
-					self.canvas.create_line(parent_x, parent_y, x, y, fill="blue", width=1)
+					self.canvas.create_line(parent_x, parent_y, x, y, fill="blue", width=1, tags=("tree", "edge"))
 
 		if self.show_most_likely_path_var.get():
 			most_likely_path = self.tree.most_likely_path
@@ -277,7 +382,113 @@ class TreeVisualizer:
 				current_node = most_likely_path[step]
 				x1, y1 = node_positions[(step-1, prev_node)]
 				x2, y2 = node_positions[(step, current_node)]
-				self.canvas.create_line(x1, y1, x2, y2, fill="green", width=4)
+				self.canvas.create_line(x1, y1, x2, y2, fill="green", width=4, tags=("tree", "path"))
+
+		if self.show_exercise_boundary_var.get() and self.tree.exercise_boundary is not None:
+			boundary_points = []
+			for step, spot in enumerate(self.tree.exercise_boundary):
+				if math.isnan(spot) or self.tree.u == self.tree.d:
+					continue
+				point = node_positions.get((step, self.tree.node_at(step, spot)))
+				if point is not None:
+					boundary_points.extend(point)
+			if len(boundary_points) >= 4:
+				self.canvas.create_line(*boundary_points, fill="red", width=3, dash=(6, 4), tags=("tree", "boundary"))
+
+		self.drawn_region = region
+
+	def current_raster_layer(self):
+		# Flattened values and the color scale only depend on the tree and the display mode, not on the view; colors
+		# themselves are looked up per pixel in draw_raster, so a new tree costs a couple of reductions, not a color per node
+		mode = "profit" if self.show_profits_var.get() else "spot" if self.show_stock_var.get() else "value"
+		if self.raster_layer is None or self.raster_layer[0] is not self.tree or self.raster_layer[1] != mode:
+			high_color = (34, 139, 34) if self.option_type_var.get() == "call" else (30, 100, 200)
+			if mode == "spot":
+				values = flatten_lattice(self.tree.prices)
+				low, high = np.log(values.min()), np.log(values.max())
+				colorize = lambda visible: gradient_colors(np.log(visible), (70, 110, 200), (235, 140, 50), low, high)
+			else:
+				values = flatten_lattice(self.tree.profit_values if mode == "profit" else self.tree.option_values)
+				peak = values.max()
+				colorize = lambda visible: value_colors(visible, high_color, (240, 128, 128), peak)
+			self.raster_layer = (self.tree, mode, values, colorize)
+		return self.raster_layer
+
+	def draw_raster(self, canvas_width, canvas_height):
+		# Large lattices are drawn as one heatmap image of the viewport, so the cost follows the pixel count rather than the steps
+		# drawn_region stays None so every pan or zoom renders the new viewport
+		steps = self.tree.steps
+		x_spacing = canvas_width / (steps + 2)
+		y_spacing = canvas_height / (steps + 2)
+		center_y = canvas_height // 2
+		_, mode, values, colorize = self.current_raster_layer()
+
+		index = raster_nodes(canvas_width, canvas_height, steps, x_spacing, y_spacing, center_y, self.zoom_factor, self.pan_offset_x, self.pan_offset_y)
+		self.raster_image = tk.PhotoImage(data=ppm_data(render_pixels(index, values, colorize)), format="PPM")
+		self.canvas.create_image(0, 0, image=self.raster_image, anchor="nw", tags=("tree", "raster"))
+
+		def position(step, node):
+			x = (step + 1) * x_spacing * self.zoom_factor + self.pan_offset_x
+			y = (center_y + (node - step/2) * y_spacing) * self.zoom_factor + self.pan_offset_y
+			return x, y
+
+		spacing = min(x_spacing, y_spacing) * self.zoom_factor
+		if spacing >= self.LABEL_MIN_SPACING:
+			font = ("Arial", int(min(12, spacing / 5)))
+			first_step = max(0, math.floor(-self.pan_offset_x / self.zoom_factor / x_spacing - 1))
+			last_step = min(steps, math.ceil((canvas_width - self.pan_offset_x) / self.zoom_factor / x_spacing - 1))
+			top = -self.pan_offset_y / self.zoom_factor
+			bottom = (canvas_height - self.pan_offset_y) / self.zoom_factor
+			for step in range(first_step, last_step + 1):
+				first_node = max(0, math.floor((top - center_y) / y_spacing + step / 2))
+				last_node = min(step, math.ceil((bottom - center_y) / y_spacing + step / 2))
+				for node in range(first_node, last_node + 1):
+					value = values[step * (step + 1) // 2 + node]
+					text = f"{value:.1f}" if mode == "spot" else f"{value:.2f}"
+					self.canvas.create_text(*position(step, node), text=text, font=font, fill='black', tags=("tree", "value_label"))
+
+		if self.show_most_likely_path_var.get():
+			path_points = [coordinate for step, node in enumerate(self.tree.most_likely_path) for coordinate in position(step, node)]
+			self.canvas.create_line(*path_points, fill="green", width=2, tags=("tree", "path"))
+
+		if self.show_exercise_boundary_var.get() and self.tree.exercise_boundary is not None and self.tree.u != self.tree.d:
+			boundary_points = []
+			for step, spot in enumerate(self.tree.exercise_boundary):
+				if not math.isnan(spot):
+					boundary_points.extend(position(step, self.tree.node_at(step, spot)))
+			if len(boundary_points) >= 4:
+				self.canvas.create_line(*boundary_points, fill="red", width=2, dash=(6, 4), tags=("tree", "boundary"))
+
+	def draw_surface(self, canvas_width, canvas_height):
+		# Spot x time heatmap read off the lattice levels, elapsed time runs left to right and spot falls downwards like the tree
+		# It is laid out to fit the canvas, so pan and zoom leave it in place
+		left, top, right, bottom = self.SURFACE_MARGINS
+		columns = max(2, (canvas_width - left - right) // self.SURFACE_CELL)
+		rows = max(2, (canvas_height - top - bottom) // self.SURFACE_CELL)
+		if self.surface_layer is None or self.surface_layer[0] is not self.tree or self.surface_layer[1] != (columns, rows):
+			self.surface_layer = (self.tree, (columns, rows), self.tree.value_surface(spot_points=rows, time_points=columns))
+		surface = self.surface_layer[2]
+
+		profits = self.show_profits_var.get()
+		values = surface['profits' if profits else 'values']
+		# Surface rows are ascending times to expiry and columns ascending spots, the image wants the opposite of both
+		grid = values[::-1].T[::-1]
+		high_color = (34, 139, 34) if self.option_type_var.get() == "call" else (30, 100, 200)
+		self.raster_image = tk.PhotoImage(data=ppm_data(surface_rgb(grid, self.SURFACE_CELL, high_color, (240, 128, 128))), format="PPM")
+		self.canvas.create_image(left, top, image=self.raster_image, anchor="nw", tags=("surface",))
+
+		width = columns * self.SURFACE_CELL
+		height = rows * self.SURFACE_CELL
+		low_spot, high_spot = surface['spots'][0], surface['spots'][-1]
+		for fraction in np.linspace(0, 1, 5):
+			spot = high_spot * (low_spot / high_spot) ** fraction
+			self.canvas.create_text(left - 6, top + fraction * height, text=f"{spot:.1f}", anchor="e", font=("Arial", 9), tags=("surface",))
+			self.canvas.create_text(left + fraction * width, top + height + 12, text=f"{fraction * self.tree.T:.2f}", font=("Arial", 9), tags=("surface",))
+		self.canvas.create_text(left + width / 2, top + height + 30, text="Time elapsed (years)", font=("Arial", 10), tags=("surface",))
+
+		label = "Profit" if profits else "Option value"
+		low, high = np.nanmin(values), np.nanmax(values)
+		self.canvas.create_text(left, top - 14, text=f"{label} by spot and time, from {low:.2f} to {high:.2f}", anchor="w", font=("Arial", 10, "bold"), tags=("surface",))
 
 	def on_param_change(self, event=None):
 		current_params = (self.steps_var.set(int(round(self.steps_var.get()))),
@@ -287,7 +498,7 @@ class TreeVisualizer:
 		self.sigma_var.set(round(self.sigma_var.get(), 3)),
 		self.T_var.set(round(self.T_var.get(), 2)))
 
-		self.tree = BinomialTree(
+		params = dict(
 			S0=max(1, self.s0_var.get()),
 			K=max(1, self.k_var.get()),
 			T=max(0.05, self.T_var.get()),
@@ -295,15 +506,92 @@ class TreeVisualizer:
 			sigma=max(0.01, self.sigma_var.get()),
 			steps=max(1, self.steps_var.get()),
 			option_type=self.option_type_var.get(),
-			max_steps=self.tree.max_steps
+			max_steps=self.MAX_STEPS,
+			exercise=self.exercise_var.get(),
+			scheme=self.scheme_var.get()
 		)
 
+		# A new generation makes every result still in flight stale
+		self.generation += 1
+		tree = shared_cache.lookup(**params)
+		if tree is not None:
+			self.apply_tree(self.generation, tree)
+			return
+
+		with self.requests:
+			self.latest_request = (self.generation, params, self.tree)
+			self.requests.notify()
+		if self.worker is None:
+			self.worker = threading.Thread(target=self.recompute_worker, daemon=True)
+			self.worker.start()
+		if not self.polling:
+			self.polling = True
+			self.root.after(self.POLL_INTERVAL, self.poll_recompute)
+
+	def recompute_worker(self):
+		# Prices first from the O(N) memory engine, then the full lattice once no newer request arrived for REBUILD_DELAY
+		handled = 0
+		while True:
+			with self.requests:
+				self.requests.wait_for(lambda: self.latest_request is None or self.latest_request[0] != handled)
+				if self.latest_request is None:
+					return
+				generation, params, base = self.latest_request
+			handled = generation
+
+			try:
+				self.results.put(("price", generation, shared_cache.get(**params, price_only=True)))
+				with self.requests:
+					self.requests.wait_for(lambda: self.latest_request is None or self.latest_request[0] != generation, timeout=self.REBUILD_DELAY)
+					if self.latest_request is None or self.latest_request[0] != generation:
+						continue
+				self.results.put(("tree", generation, shared_cache.derive(base, **params)))
+			except Exception as error:
+				self.results.put(("error", generation, error))
+
+	def stop_worker(self):
+		with self.requests:
+			self.latest_request = None
+			self.requests.notify()
+
+	def poll_recompute(self):
+		while True:
+			try:
+				kind, generation, result = self.results.get_nowait()
+			except queue.Empty:
+				break
+			if generation != self.generation:
+				continue
+			if kind == "price":
+				self.update_price_display(result)
+			elif kind == "tree":
+				self.apply_tree(generation, result)
+			else:
+				self.tree_generation = generation
+				self.price_label.config(text=f"Option price: error ({result})")
+
+		if self.tree_generation != self.generation:
+			self.root.after(self.POLL_INTERVAL, self.poll_recompute)
+		else:
+			self.polling = False
+
+	def apply_tree(self, generation, tree):
+		self.tree = tree
+		self.tree_generation = generation
 		self.update_price_display()
 		self.draw_tree()
 
-	def update_price_display(self):
-		self.price_label.config(text=f"Option price: {self.tree.option_price:.2f}")
-		self.payoff_label.config(text=f"Estimated payoff at T: {self.tree.most_likely_payoff:.2f} with probability {self.tree.most_likely_prob * 100:.2f}%")
+	def update_price_display(self, tree=None):
+		tree = tree or self.tree
+		if tree.price_only:
+			distribution = tree.terminal_distribution(quantiles=())
+			payoff = distribution['payoffs'][distribution['mode']]
+			probability = distribution['mode_probability']
+		else:
+			payoff = tree.most_likely_payoff
+			probability = tree.most_likely_prob
+		self.price_label.config(text=f"Option price: {tree.option_price:.2f}")
+		self.payoff_label.config(text=f"Estimated payoff at T: {payoff:.2f} with probability {probability * 100:.2f}%")
 
 	def on_resize(self, event):
 		if hasattr(self, '_resize_after'):
@@ -318,7 +606,9 @@ class TreeVisualizer:
 			'T': self.tree.T,
 			'r': self.tree.r,
 			'sigma': self.tree.sigma,
-			'option_type': self.tree.option_type
+			'option_type': self.tree.option_type,
+			'exercise': self.tree.exercise,
+			'scheme': self.tree.scheme
 		}
 
 		self.convergence_plot = ConvergencePlot(self.root, tree_params)
\ No newline at end of file